@@ -0,0 +1,171 @@
+from django.core.files.storage import default_storage
+from pathlib import PurePosixPath
+
+# Application modules
+from apps.books.models import Book, Author, Publisher, Genre, Collection, Section, Rating, Status, Price
+from apps.core.images import PENDING_DIR
+
+
+def image_url(name):
+    # Stored images only, a pending upload has no thumbnail yet
+    if not name or PurePosixPath(name).parent.name == PENDING_DIR:
+        return None
+    return default_storage.url(name)
+
+
+class Resource:
+    """
+    A model exposed by the API. Fields map the public field names to model
+    lookups read with values(), converters turn stored values into JSON ones.
+    Every resource is restricted to the rows of the requesting user.
+    """
+    name = None
+    model = None
+    fields = {}
+    default_fields = None
+    converters = {}
+
+    def get_queryset(self, user):
+        # The same per-user restriction as the views
+        return self.model.objects.filter(user=user)
+
+    def get_fields(self, requested=None):
+        """
+        Return the public names of a sparse fieldset, or raise KeyError with the unknown ones.
+        """
+        if not requested:
+            return list(self.default_fields or self.fields)
+        unknown = [name for name in requested if name not in self.fields]
+        if unknown:
+            raise KeyError(', '.join(unknown))
+        # The id identifies every object and is always included
+        return ['id'] + [name for name in requested if name != 'id']
+
+    def lookups(self, fields):
+        return [self.fields[name] for name in fields]
+
+    def serialize(self, row, fields):
+        data = {}
+        for name in fields:
+            value = row[self.fields[name]]
+            converter = self.converters.get(name)
+            data[name] = converter(value) if converter else value
+        return data
+
+
+class NamedResource(Resource):
+    fields = {
+        'id': 'pk',
+        'name': 'name',
+        'description': 'description',
+        'created': 'created',
+        'modified': 'modified',
+    }
+
+class AuthorResource(Resource):
+    name = 'authors'
+    model = Author
+    fields = {
+        'id': 'pk',
+        'name': 'name',
+        'date_of_birth': 'date_of_birth',
+        'date_of_death': 'date_of_death',
+        'summary': 'summary',
+        'headshot': 'headshot',
+        'created': 'created',
+        'modified': 'modified',
+    }
+    converters = {'headshot': image_url}
+
+class PublisherResource(NamedResource):
+    name = 'publishers'
+    model = Publisher
+
+class GenreResource(NamedResource):
+    name = 'genres'
+    model = Genre
+
+class CollectionResource(NamedResource):
+    name = 'collections'
+    model = Collection
+
+class SectionResource(NamedResource):
+    name = 'sections'
+    model = Section
+
+class BookResource(Resource):
+    name = 'books'
+    model = Book
+    fields = {
+        'id': 'pk',
+        'isbn': 'isbn',
+        'title': 'title',
+        'author': 'author_id',
+        'publisher': 'publisher_id',
+        'genre': 'genre_id',
+        'collection': 'collection_id',
+        'volume_number': 'volume_number',
+        'section': 'section_id',
+        'category': 'category',
+        'language': 'language',
+        'copyright': 'copyright',
+        'edition': 'edition',
+        'comments': 'comments',
+        'cover_image': 'cover_image',
+        'created': 'created',
+        'modified': 'modified',
+    }
+    converters = {'cover_image': image_url}
+
+class StatusResource(Resource):
+    name = 'statuses'
+    model = Status
+    fields = {
+        'id': 'pk',
+        'book': 'book_id',
+        'status': 'status',
+        'created': 'created',
+        'modified': 'modified',
+    }
+
+class RatingResource(Resource):
+    name = 'ratings'
+    model = Rating
+    fields = {
+        'id': 'pk',
+        'book': 'book_id',
+        'rating': 'rating',
+        'created': 'created',
+        'modified': 'modified',
+    }
+
+class PriceResource(Resource):
+    name = 'prices'
+    model = Price
+    fields = {
+        'id': 'pk',
+        'book': 'book_id',
+        'currency': 'currency',
+        'purchase_price': 'purchase_price',
+        'purchase_date': 'purchase_date',
+        'sale_price': 'sale_price',
+        'price_source': 'price_source',
+        'created': 'created',
+        'modified': 'modified',
+    }
+
+
+# Resources by their URL name
+RESOURCES = {
+    resource.name: resource
+    for resource in [
+        BookResource(), AuthorResource(), PublisherResource(), GenreResource(),
+        CollectionResource(), SectionResource(), StatusResource(), RatingResource(), PriceResource(),
+    ]
+}
+
+def resource_for(model):
+    for resource in RESOURCES.values():
+        if resource.model is model:
+            return resource
+    return None
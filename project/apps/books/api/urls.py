@@ -0,0 +1,10 @@
+from django.urls import path
+from apps.books.api import views
+
+
+urlpatterns = [
+    path('sync/', views.SyncView.as_view(), name='api_sync'),
+    path('batch/', views.BatchView.as_view(), name='api_batch'),
+    path('<str:resource>/', views.ResourceView.as_view(), name='api_list'),
+    path('<str:resource>/<int:pk>/', views.ResourceView.as_view(), name='api_detail'),
+]
@@ -0,0 +1,175 @@
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, quote_etag
+from django.views import View
+import hashlib
+import json
+
+# Application modules
+from apps.books.api.resources import RESOURCES
+from apps.books.pagination import KeysetPaginator, InvalidCursor
+from apps.books.sync import changes_since, read_token
+from apps.books.services import apply_book_changes
+
+
+API_VERSION = 'v1'
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Changes accepted per batch request
+MAX_BATCH_SIZE = 1000
+
+
+class ValuesKeysetPaginator(KeysetPaginator):
+    """
+    Keyset pagination over values() rows, ordered by primary key only.
+    """
+    salt = 'books.api.cursor'
+
+    @staticmethod
+    def get_ordering(queryset, ordering=None):
+        return list(ordering or ['pk'])
+
+    def get_values(self, row):
+        return [row[field.lstrip('-')] for field in self.ordering]
+
+
+def error(status, message):
+    return JsonResponse({'error': message}, status=status)
+
+
+class ApiView(View):
+    """
+    Base of the JSON API views: session authenticated, JSON errors, and
+    responses that are private to the user and vary with the session cookie.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error(401, 'Authentication required.')
+
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except Http404 as e:
+            response = error(404, str(e) or 'Not found.')
+
+        patch_vary_headers(response, ['Cookie'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def http_method_not_allowed(self, request, *args, **kwargs):
+        response = error(405, f'Method {request.method} not allowed.')
+        response['Allow'] = ', '.join(method.upper() for method in self._allowed_methods())
+        return response
+
+
+class ResourceView(ApiView):
+    """
+    Read-only access to a resource, as a list or a single object.
+    Query parameters: fields=name,... for a sparse fieldset, cursor and page_size.
+    The strong ETag covers the newest modified timestamp and the size of the
+    result, a matching If-None-Match gets 304 before anything is serialized.
+    """
+    def get_resource(self):
+        resource = RESOURCES.get(self.kwargs['resource'])
+        if resource is None:
+            raise Http404('Unknown resource.')
+        return resource
+
+    def get(self, request, *args, **kwargs):
+        resource = self.get_resource()
+        try:
+            fields = resource.get_fields([name for name in request.GET.get('fields', '').split(',') if name])
+        except KeyError as e:
+            return error(400, f'Unknown fields: {e.args[0]}')
+
+        queryset = resource.get_queryset(request.user)
+        if 'pk' in kwargs:
+            queryset = queryset.filter(pk=kwargs['pk'])
+
+        # One aggregate query decides whether anything changed; the count catches deletions
+        state = queryset.order_by().aggregate(modified=Max('modified'), count=Count('pk'))
+        if 'pk' in kwargs and not state['count']:
+            raise Http404('Not found.')
+
+        etag = self.get_etag(resource, state)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            if 'pk' in kwargs:
+                response = self.get_object(resource, queryset, fields)
+            else:
+                response = self.get_list(resource, queryset, fields)
+
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
+
+    def get_etag(self, resource, state):
+        # The query string holds the fieldset and the page, it is part of the representation
+        modified = state['modified'].isoformat() if state['modified'] else ''
+        key = f"{API_VERSION}:{resource.name}:{self.request.user.pk}:{state['count']}:{modified}:{self.request.GET.urlencode()}"
+        return quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+    def get_object(self, resource, queryset, fields):
+        row = queryset.values(*resource.lookups(fields)).get()
+        return JsonResponse({'data': resource.serialize(row, fields)})
+
+    def get_list(self, resource, queryset, fields):
+        try:
+            page_size = min(max(int(self.request.GET.get('page_size', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return error(400, 'Invalid page_size.')
+
+        # The primary key orders the pages, it has to be read even when not requested
+        lookups = resource.lookups(fields)
+        rows = queryset.values(*lookups, *(['pk'] if 'pk' not in lookups else []))
+        paginator = ValuesKeysetPaginator(rows, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            return error(400, str(e))
+
+        return JsonResponse({
+            'data': [resource.serialize(row, fields) for row in page.object_list],
+            'next': self.get_page_url(page.next_cursor) if page.has_next() else None,
+            'previous': self.get_page_url(page.previous_cursor) if page.has_previous() else None,
+        })
+
+    def get_page_url(self, cursor):
+        query = self.request.GET.copy()
+        query['cursor'] = cursor
+        return self.request.build_absolute_uri(f'{self.request.path}?{query.urlencode()}')
+
+
+class SyncView(ApiView):
+    """
+    Changes of the user's objects since a sync token: ?since=<token> returns the
+    objects saved and the ids deleted after it, and the token of the next sync.
+    A missing or expired token returns every object, with "full": true.
+    """
+    def get(self, request, *args, **kwargs):
+        since = read_token(request.GET.get('since'))
+        return JsonResponse(changes_since(request.user, since))
+
+
+class BatchView(ApiView):
+    """
+    Change the rating, status and price of many books in one request and one transaction.
+    Expects {"changes": [{"book": 1, "rating": 4}, {"book": 2, "status": "s", "price": {"sale_price": "5.00"}}]}
+    and returns a result per change, in order.
+    """
+    def post(self, request, *args, **kwargs):
+        try:
+            changes = json.loads(request.body)['changes']
+        except (ValueError, KeyError, TypeError):
+            return error(400, 'Expected a JSON object with a list of changes.')
+        if not isinstance(changes, list):
+            return error(400, 'Expected a JSON object with a list of changes.')
+        if len(changes) > MAX_BATCH_SIZE:
+            return error(400, f'At most {MAX_BATCH_SIZE} changes per request.')
+
+        results = apply_book_changes(request.user, changes)
+        return JsonResponse({
+            'applied': sum(result['success'] for result in results),
+            'results': results,
+        })
@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+# Application modules
+from apps.books import urls
+from apps.books.generators import LibraryGenerator
+from apps.books.models import Book, Collection, Section
+
+
+SIZES = [1_000, 10_000, 100_000]
+
+# Query strings of the pages that need one
+QUERIES = {
+    'library_search': {'q': 'river'},
+    'library_suggest': {'q': 'riv'},
+}
+
+# Models of the <pk> argument of pages whose view does not name it
+PK_MODELS = {
+    'section_book_select': Section,
+    'collection_book_select': Collection,
+}
+
+
+def benchmark_user(size, seed=0):
+    """
+    Return the benchmark user with a library of the given size, generating it on first use.
+    """
+    user, created = User.objects.get_or_create(username=f'benchmark-{size}')
+    missing = size - Book.objects.filter(user=user).count()
+    if missing > 0:
+        LibraryGenerator(user, seed=seed).run(missing)
+    return user
+
+def get_pages(user, names=None):
+    """
+    Return (URL name, path) of the pages of apps/books/urls.py answering GET requests,
+    with the <pk> arguments pointing to objects of the user.
+    """
+    pages = []
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern) or (names and pattern.name not in names):
+            continue
+        view_class = getattr(pattern.callback, 'view_class', None)
+        if view_class is None or not hasattr(view_class, 'get'):
+            continue
+
+        kwargs = {}
+        if 'pk' in pattern.pattern.converters:
+            model = PK_MODELS.get(pattern.name) or view_class.model
+            obj = model.objects.filter(user=user).order_by('pk').first()
+            if obj is None:
+                continue
+            kwargs['pk'] = obj.pk
+
+        pages.append((pattern.name, reverse(pattern.name, kwargs=kwargs)))
+    return pages
+
+def time_request(client, path, data=None):
+    """
+    Return the status, latency in milliseconds and queries of one request, streamed responses consumed in full.
+    """
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(path, data)
+        if response.streaming:
+            for chunk in response.streaming_content:
+                pass
+    elapsed = (time.perf_counter() - start) * 1000
+    return response.status_code, elapsed, len(queries.captured_queries)
+
+def trace_memory(client, path, data=None):
+    # Peak Python memory of one request in KiB, traced apart as tracing slows requests down
+    tracemalloc.start()
+    try:
+        time_request(client, path, data)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+def run_benchmark(sizes=SIZES, repeat=5, names=None, seed=0, stdout=None):
+    """
+    Time every page at each library size, after one warm-up request.
+    Returns a report with the median and slowest latency in milliseconds,
+    the queries of the last run and the peak Python memory in KiB.
+    """
+    results = []
+    # Requests of the test client come from the host 'testserver'
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for size in sizes:
+            results.extend(benchmark_size(size, repeat, names, seed, stdout))
+
+    return {
+        'commit': git_commit(),
+        'database': connection.vendor,
+        'created': timezone.now().isoformat(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+def benchmark_size(size, repeat, names=None, seed=0, stdout=None):
+    user = benchmark_user(size, seed=seed)
+    # Failing pages are reported with their status instead of stopping the run
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+
+    results = []
+    for name, path in get_pages(user, names):
+        data = QUERIES.get(name)
+        time_request(client, path, data)
+        runs = [time_request(client, path, data) for i in range(repeat)]
+        latencies = [elapsed for status, elapsed, queries in runs]
+        status, elapsed, queries = runs[-1]
+
+        result = {
+            'size': size,
+            'name': name,
+            'path': path,
+            'status': status,
+            'queries': queries,
+            'latency_median_ms': round(statistics.median(latencies), 2),
+            'latency_max_ms': round(max(latencies), 2),
+            'memory_peak_kib': trace_memory(client, path, data),
+        }
+        results.append(result)
+        if stdout is not None:
+            stdout.write(
+                f"{size:>8} {name:<28} {status} {queries:>4} queries "
+                f"{result['latency_median_ms']:>9.2f} ms {result['memory_peak_kib']:>9.1f} KiB"
+            )
+
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
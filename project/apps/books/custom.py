@@ -1,4 +1,18 @@
+from django.core.cache import cache
 from django.template.defaulttags import register
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+# Application modules
+from apps.core.images import is_pending, get_renditions
+from apps.core.cache import get_namespace, user_cache_key
+from apps.core.instrumentation import count_cache
+
+
+# Rendered cards are kept for an hour at most, e.g. until new image renditions show up
+CARD_TIMEOUT = 60 * 60
 
 
 # Define range for django jinja template
@@ -22,4 +36,76 @@ def average_rating(self):
     ratings = self.ratings.all()
     if ratings:
         return sum(rating.rating for rating in ratings) / ratings.count()
-    return 0
\ No newline at end of file
+    return 0
+@register.filter
+def image_url(field_file, placeholder):
+    """
+    Return the URL of an image field, or the static placeholder while its thumbnail is pending.
+    Usage: {{ book.cover_image|image_url:'images/book.png' }}
+    """
+    if not field_file or is_pending(field_file):
+        return static(placeholder)
+    return field_file.url
+
+@register.simple_tag
+def picture(field_file, rendition, placeholder, alt='', width=None, height=None, sizes=None, css_class='image'):
+    """
+    Render an image field as a <picture> with WebP and JPEG srcset sources,
+    falling back to the PNG thumbnail.
+    Usage: {% picture book.cover_image 'cover' 'images/book.png' alt=book.title width=200 height=300 %}
+    """
+    sizes = sizes or (f'{width}px' if width else '100vw')
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (content_type, ', '.join(f'{url} {size}w' for url, size in items), sizes)
+            for content_type, items in get_renditions(field_file, rendition).items()
+        )
+    )
+    dimensions = format_html_join(
+        '', ' {}="{}"',
+        ((name, value) for name, value in [('width', width), ('height', height)] if value)
+    )
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" class="{}"{} loading="lazy"/></picture>',
+        sources, image_url(field_file, placeholder), alt, css_class, dimensions
+    )
+
+@register.simple_tag(takes_context=True)
+def render_cards(context, books, template_name):
+    """
+    Render a card template for each book, cached per card in the user's namespace.
+    All the cards are read with one multi-get, only the misses are rendered.
+    Usage: {% render_cards object_list 'books/library_card.html' %}
+    """
+    request = context['request']
+    version = get_namespace(request.user.pk)
+    language = get_language()
+
+    keys = {}
+    for book in books:
+        keys[book.pk] = user_cache_key(
+            request.user.pk, 'card', template_name, request.path, language,
+            book.pk, book.modified.timestamp(), getattr(book, 'rating', ''), getattr(book, 'status', ''),
+            book.language or '', book.cover_image.name if book.cover_image else '',
+            version=version,
+        )
+
+    cached = cache.get_many(list(keys.values()))
+    template = context.template.engine.get_template(template_name)
+    cards = []
+    misses = {}
+
+    for book in books:
+        html = cached.get(keys[book.pk])
+        if html is None:
+            with context.push(book=book):
+                html = template.render(context)
+            misses[keys[book.pk]] = html
+        cards.append(html)
+
+    count_cache(hits=len(cards) - len(misses), misses=len(misses))
+    if misses:
+        cache.set_many(misses, CARD_TIMEOUT)
+
+    return mark_safe(''.join(cards))
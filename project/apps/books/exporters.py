@@ -0,0 +1,156 @@
+from django.core.files.storage import default_storage
+from django.db.models import Q, FilteredRelation
+from django.core.serializers.json import DjangoJSONEncoder
+import csv
+import json
+import logging
+import posixpath
+import time
+import zipfile
+
+# Application modules
+from apps.books.models import Book
+from apps.books.importers import COLUMNS
+
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'zip': ('application/zip', 'zip'),
+}
+
+# Rows fetched per database round trip
+CHUNK_SIZE = 2000
+
+# Bytes copied per read of a cover file
+COPY_SIZE = 64 * 1024
+
+# Query paths of the exported columns, in the order of the import columns
+FIELDS = {
+    'isbn': 'isbn',
+    'title': 'title',
+    'author': 'author__name',
+    'publisher': 'publisher__name',
+    'genre': 'genre__name',
+    'collection': 'collection__name',
+    'volume_number': 'volume_number',
+    'section': 'section__name',
+    'category': 'category',
+    'language': 'language',
+    'copyright': 'copyright',
+    'edition': 'edition',
+    'comments': 'comments',
+    'status': 'status',
+    'rating': 'rating',
+    'currency': 'user_price__currency',
+    'purchase_price': 'user_price__purchase_price',
+    'purchase_date': 'user_price__purchase_date',
+    'sale_price': 'user_price__sale_price',
+    'price_source': 'user_price__price_source',
+}
+
+
+# --- Rows
+def export_rows(user):
+    """
+    Iterate over the export rows of a user's library, in the column layout read by the importer.
+    Rows are fetched as tuples in chunks with a server side cursor where available.
+    """
+    queryset = Book.objects.library_for(user).annotate(
+        user_price=FilteredRelation('prices', condition=Q(prices__user=user)),
+    ).order_by('pk').values_list(*[FIELDS[column] for column in COLUMNS])
+
+    for values in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield dict(zip(COLUMNS, values))
+
+class Echo:
+    """
+    File-like object returning what is written, to stream csv writer output.
+    """
+    def write(self, value):
+        return value
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([row[column] for column in COLUMNS])
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps({column: row[column] for column in COLUMNS}, cls=DjangoJSONEncoder) + '\n'
+
+
+# --- Zip
+class ZipBuffer:
+    """
+    Unseekable write target for zipfile, emptied each time the archive is streamed further.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+def stream_zip(user):
+    """
+    Stream a zip archive holding books.csv and the cover files, named covers/<isbn>.<ext>.
+    Covers are copied from storage in small reads and stored as is, being compressed images already.
+    """
+    buffer = ZipBuffer()
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('books.csv', 'w', force_zip64=True) as entry:
+            for line in stream_csv(export_rows(user)):
+                entry.write(line.encode('utf-8'))
+                if buffer.size >= COPY_SIZE:
+                    yield buffer.pop()
+
+        # Second pass over the covers only, instead of keeping them from the first one
+        placeholder = Book._meta.get_field('cover_image').default
+        covers = Book.objects.filter(user=user).exclude(cover_image__in=['', placeholder])
+        covers = covers.order_by('pk').values_list('isbn', 'cover_image')
+
+        for isbn, name in covers.iterator(chunk_size=CHUNK_SIZE):
+            try:
+                source = default_storage.open(name, 'rb')
+            except OSError as e:
+                logging.error(f'Export skipped cover {name}: {e}')
+                continue
+
+            info = zipfile.ZipInfo(f'covers/{isbn}{posixpath.splitext(name)[1].lower()}', time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+
+            with source, archive.open(info, 'w', force_zip64=True) as entry:
+                while data := source.read(COPY_SIZE):
+                    entry.write(data)
+                    yield buffer.pop()
+
+    yield buffer.pop()
+
+
+def stream_export(user, format):
+    if format == 'csv':
+        return stream_csv(export_rows(user))
+    if format == 'jsonl':
+        return stream_jsonl(export_rows(user))
+    if format == 'zip':
+        return stream_zip(user)
+    raise ValueError(f'Unsupported export format: {format}')
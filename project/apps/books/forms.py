@@ -1,6 +1,4 @@
 from django import forms
-from django.db.models import OuterRef, Subquery, CharField, Value
-from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
@@ -289,16 +287,22 @@ class BookSelectionForm(forms.Form):
 
         # If a user is provided, filter the books by the current user
         if user is not None:                   
-            # Subquery to get the status for each book for the current user
-            status_subquery = Status.objects.filter(
-                book=OuterRef('pk'),
-                user=user
-            ).values('status')[:1]
-
-            # Annotate each book with the user rating and book status
-            queryset = Book.objects.annotate(
-                status=Coalesce(Subquery(status_subquery, output_field=CharField()), Value(''))
+            # Books with status in the specified list for the current user
+            self.fields['books'].queryset = Book.objects.library_for(
+                user, statuses=[Status.TO_READ, Status.AVAILABLE, Status.RESERVED, Status.LOANED]
             )
 
-            # Apply filters, books with status in the specified list
-            self.fields['books'].queryset = queryset.filter(status__in=[ 't', 'a', 'r', 'l'])
+class BookImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('', _('From file extension')),
+        ('csv', 'CSV'),
+        ('json', 'JSON'),
+        ('jsonl', 'JSON Lines'),
+    ]
+
+    file = forms.FileField(
+        label=_('File'),
+        widget=forms.FileInput(attrs={'accept': '.csv, .json, .jsonl'}),
+        help_text=_('One book per row, with a header line for CSV files.'),
+    )
+    format = forms.ChoiceField(label=_('Format'), choices=FORMAT_CHOICES, required=False)
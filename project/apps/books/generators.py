@@ -0,0 +1,143 @@
+from django.db import transaction
+from django.db.models import Max
+from datetime import date, timedelta
+from decimal import Decimal
+import random
+
+# Application modules
+from apps.books.models import Book, Author, Publisher, Genre, Collection, Section, Rating, Status, Price
+from apps.books.services import create_books
+from apps.books.validators import normalize_text
+
+
+# Generated ISBNs use the 979-8 prefix, numbered upwards from the highest one in use
+ISBN_PREFIX = '9798'
+
+WORDS = [
+    'silent', 'river', 'shadow', 'garden', 'winter', 'empire', 'stone', 'light', 'ocean', 'forest',
+    'secret', 'night', 'golden', 'city', 'storm', 'memory', 'crown', 'journey', 'fire', 'glass',
+    'house', 'mountain', 'letter', 'island', 'dream', 'wolf', 'star', 'bridge', 'summer', 'iron',
+]
+NAMES = [
+    'Ana', 'Bruno', 'Clara', 'David', 'Elena', 'Filipe', 'Greta', 'Hugo', 'Ines', 'Jonas',
+    'Karin', 'Luis', 'Marta', 'Nuno', 'Olga', 'Pedro', 'Rita', 'Sofia', 'Tiago', 'Vera',
+]
+SURNAMES = [
+    'Almeida', 'Berg', 'Costa', 'Dias', 'Esteves', 'Fischer', 'Gomes', 'Hansen', 'Lopes', 'Martins',
+    'Nunes', 'Oliveira', 'Pereira', 'Quintas', 'Ribeiro', 'Santos', 'Teixeira', 'Vieira', 'Weber', 'Xavier',
+]
+
+
+def isbn13(number):
+    """
+    Return the valid ISBN-13 with the given 8-digit sequence number after ISBN_PREFIX.
+    """
+    digits = f'{ISBN_PREFIX}{number:08d}'
+    total = sum((3 if i % 2 else 1) * int(num) for i, num in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+def next_isbn_number():
+    # ISBNs are unique across all users, continue after the highest generated one
+    highest = Book.objects.filter(isbn__startswith=ISBN_PREFIX).aggregate(isbn=Max('isbn'))['isbn']
+    return int(highest[len(ISBN_PREFIX):12]) + 1 if highest else 0
+
+
+class LibraryGenerator:
+    """
+    Fill the library of a user with synthetic books and related objects,
+    written with bulk inserts in chunks. The same seed gives the same library.
+    """
+    def __init__(self, user, seed=None, chunk_size=2000):
+        self.user = user
+        self.random = random.Random(seed)
+        self.chunk_size = chunk_size
+
+    def run(self, books, authors=None, publishers=None, genres=None, collections=None, sections=None):
+        # Related object counts default to proportions of a real library
+        authors = self.create_related(Author, 'Author', authors if authors is not None else max(books // 10, 1))
+        publishers = self.create_related(Publisher, 'Publisher', publishers if publishers is not None else max(books // 50, 1))
+        # Genre names are unique across users
+        genres = self.create_related(Genre, f'Genre {self.user.pk}', genres if genres is not None else 20)
+        collections = self.create_related(Collection, 'Collection', collections if collections is not None else books // 100)
+        sections = self.create_related(Section, 'Section', sections if sections is not None else 10)
+
+        number = next_isbn_number()
+        offset = Book.objects.filter(user=self.user).count()
+        # Volumes continue after those of earlier runs
+        volumes = dict(
+            Book.objects.filter(user=self.user, collection__isnull=False)
+            .values('collection').annotate(volume=Max('volume_number')).values_list('collection', 'volume')
+        )
+
+        for start in range(0, books, self.chunk_size):
+            chunk = []
+            for i in range(start, min(start + self.chunk_size, books)):
+                book = Book(
+                    isbn=isbn13(number + i),
+                    title=self.title(offset + i),
+                    author=self.pick(authors),
+                    publisher=self.pick(publishers),
+                    genre=self.pick(genres),
+                    section=self.pick(sections),
+                    category=self.random.choice(Book.CATEGORY_CHOICES)[0],
+                    language=self.random.choice(['en', 'pt', 'fr', 'de', None]),
+                    copyright=self.random.randint(1900, date.today().year),
+                    edition=self.random.randint(1, 5),
+                    comments=' '.join(self.random.choices(WORDS, k=12)) if self.random.random() < 0.3 else None,
+                    user=self.user,
+                )
+                # One book in ten belongs to a collection, numbered in order
+                if collections and self.random.random() < 0.1:
+                    book.collection = self.random.choice(collections)
+                    book.volume_number = volumes[book.collection.pk] = (volumes.get(book.collection.pk) or 0) + 1
+                chunk.append(book)
+
+            with transaction.atomic():
+                chunk = create_books(chunk, defaults=False)
+                self.create_records(chunk)
+
+        return books
+
+    def create_related(self, model, prefix, count):
+        existing = model.objects.filter(user=self.user).count()
+        objects = []
+        for i in range(existing, existing + count):
+            if model is Author:
+                name = f'{NAMES[i % len(NAMES)]} {SURNAMES[i // len(NAMES) % len(SURNAMES)]} {i}'
+            else:
+                name = f'{prefix} {i}'
+            objects.append(model(name=name, normalized_name=normalize_text(name), user=self.user))
+
+        for start in range(0, len(objects), self.chunk_size):
+            model.objects.bulk_create(objects[start:start + self.chunk_size])
+
+        return list(model.objects.filter(user=self.user))
+
+    def create_records(self, books):
+        ratings, statuses, prices = [], [], []
+        for book in books:
+            ratings.append(Rating(book=book, user=self.user, rating=self.random.randint(0, 5)))
+            statuses.append(Status(book=book, user=self.user, status=self.random.choice(Status.STATUS_CHOICES)[0]))
+            purchase_price = Decimal(self.random.randint(200, 6000)) / 100
+            prices.append(Price(
+                book=book, user=self.user,
+                currency='EUR',
+                purchase_price=purchase_price,
+                purchase_date=date.today() - timedelta(days=self.random.randint(0, 3650)),
+                sale_price=purchase_price * Decimal('0.5'),
+                price_source=Price.PURCHASE,
+            ))
+
+        Rating.objects.bulk_create(ratings)
+        Status.objects.bulk_create(statuses)
+        Price.objects.bulk_create(prices)
+
+    def title(self, i):
+        # Unique per user by the trailing number, searchable by its words
+        words = self.random.sample(WORDS, self.random.randint(1, 3))
+        return f"THE {' '.join(words)} {i}".upper()
+
+    def pick(self, objects, empty=0.05):
+        if not objects or self.random.random() < empty:
+            return None
+        return self.random.choice(objects)
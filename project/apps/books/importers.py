@@ -0,0 +1,394 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.db import IntegrityError, connection, transaction
+from django.utils.translation import gettext_lazy as _
+from datetime import date
+from decimal import Decimal, InvalidOperation
+import codecs
+import csv
+import json
+
+# Application modules
+from apps.books.models import Book, Author, Publisher, Genre, Collection, Section, Rating, Status, Price
+from apps.books.validators import isbn13_validator, normalize_text
+from apps.books.search import get_backend
+from apps.books.library import refresh_entries
+from apps.core.cache import bump_namespace
+
+
+# Columns accepted in import files
+COLUMNS = [
+    'isbn', 'title', 'author', 'publisher', 'genre', 'collection', 'volume_number', 'section',
+    'category', 'language', 'copyright', 'edition', 'comments',
+    'status', 'rating', 'currency', 'purchase_price', 'purchase_date', 'sale_price', 'price_source',
+]
+
+FORMATS = ['csv', 'json', 'jsonl']
+
+
+# --- Readers
+def read_rows(stream, format):
+    """
+    Iterate over the rows of a binary import stream without loading it whole.
+    CSV needs a header line, JSON is an array of objects and JSON Lines one object per line.
+    """
+    text = codecs.getreader('utf-8-sig')(stream)
+
+    if format == 'csv':
+        yield from csv.DictReader(text)
+    elif format == 'jsonl':
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+    elif format == 'json':
+        yield from _iter_json_array(text)
+    else:
+        raise ValueError(f'Unsupported import format: {format}')
+
+def _iter_json_array(text, chunk_size=65536):
+    # Decode the objects of a JSON array one at a time from a text stream
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer and not eof:
+                chunk = text.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            if not buffer.startswith('['):
+                raise ValueError('A JSON import must be an array of objects.')
+            buffer = buffer[1:]
+            started = True
+            continue
+
+        buffer = buffer.lstrip(', \t\r\n')
+        if buffer.startswith(']'):
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = text.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        yield obj
+        buffer = buffer[end:]
+
+def format_from_name(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return extension if extension in FORMATS else 'csv'
+
+
+# --- Importer
+class BookImporter:
+    """
+    Create books from import rows in chunks, one transaction per chunk.
+    Authors, publishers, genres, collections and sections are resolved by their
+    normalized name and created when missing, books and their rating, status
+    and price rows are written with one bulk insert per table and chunk.
+    """
+    # Related name columns and the model each one resolves to
+    related = [
+        ('author', Author),
+        ('publisher', Publisher),
+        ('genre', Genre),
+        ('collection', Collection),
+        ('section', Section),
+    ]
+
+    def __init__(self, user, chunk_size=500):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.errors = []
+        # Resolved related objects per model, by normalized name
+        self.reset_cache()
+
+    def run(self, rows):
+        chunk = []
+        for line, row in enumerate(rows, start=1):
+            chunk.append((line, row))
+            if len(chunk) >= self.chunk_size:
+                self.import_chunk(chunk)
+                chunk = []
+
+        if chunk:
+            self.import_chunk(chunk)
+
+        self.errors.sort(key=lambda error: error[0])
+        return self
+
+    def import_chunk(self, chunk):
+        entries = []
+        for line, row in chunk:
+            try:
+                entries.append((line, self.clean_row(row)))
+            except ValidationError as e:
+                self.errors.append((line, ' '.join(e.messages)))
+
+        entries = self.exclude_existing(entries)
+        if not entries:
+            return
+
+        errors = len(self.errors)
+        try:
+            self.save_entries(entries)
+        except IntegrityError:
+            # A row the checks missed, e.g. a book added meanwhile: save the rows
+            # one at a time to skip only the failing ones
+            del self.errors[errors:]
+            self.reset_cache()
+            for line, data in entries:
+                try:
+                    self.save_entries([(line, data)])
+                except IntegrityError as e:
+                    self.reset_cache()
+                    self.errors.append((line, _('The book could not be saved: %(error)s') % {'error': e}))
+
+    def save_entries(self, entries):
+        with transaction.atomic():
+            self.resolve_related([data for line, data in entries])
+            entries = self.exclude_volume_clashes(entries)
+            if not entries:
+                return
+
+            books = [self.build_book(data) for line, data in entries]
+            Book.objects.bulk_create(books)
+
+            Rating.objects.bulk_create([
+                Rating(book=book, user=self.user, rating=data['rating'])
+                for book, (line, data) in zip(books, entries)
+            ])
+            Status.objects.bulk_create([
+                Status(book=book, user=self.user, status=data['status'])
+                for book, (line, data) in zip(books, entries)
+            ])
+            Price.objects.bulk_create([
+                Price(
+                    book=book, user=self.user,
+                    currency=data['currency'],
+                    purchase_price=data['purchase_price'],
+                    purchase_date=data['purchase_date'],
+                    sale_price=data['sale_price'],
+                    price_source=data['price_source'],
+                )
+                for book, (line, data) in zip(books, entries)
+            ])
+
+            get_backend().update([book.pk for book in books])
+            refresh_entries([book.pk for book in books])
+            bump_namespace(self.user.pk)
+
+        self.created += len(books)
+
+    def clean_row(self, row):
+        if not isinstance(row, dict):
+            raise ValidationError(_('A row must be an object of column values.'))
+
+        row = {key.strip().lower(): (value.strip() if isinstance(value, str) else value) for key, value in row.items() if key}
+        data = {}
+
+        # Validate ISBN-13, ignoring the usual separators
+        data['isbn'] = str(row.get('isbn') or '').replace('-', '').replace(' ', '')
+        isbn13_validator(data['isbn'])
+
+        data['title'] = str(row.get('title') or '').upper()
+        if not data['title']:
+            raise ValidationError(_('The title is required.'))
+        if len(data['title']) > Book._meta.get_field('title').max_length:
+            raise ValidationError(_('The title is too long.'))
+
+        for name, model in self.related:
+            data[name] = str(row.get(name) or '')[:model._meta.get_field('name').max_length]
+
+        data['category'] = self.choice(row.get('category'), Book.CATEGORY_CHOICES, Book.FICTION, 'category')
+        data['language'] = self.choice(row.get('language'), Book._meta.get_field('language').choices, None, 'language')
+        data['comments'] = str(row.get('comments') or '')[:500] or None
+        for name in ['copyright', 'edition', 'volume_number']:
+            data[name] = self.integer(row.get(name), name, Book._meta.get_field(name))
+
+        data['status'] = self.choice(row.get('status'), Status.STATUS_CHOICES, Status.AVAILABLE, 'status')
+        data['rating'] = self.integer(row.get('rating'), 'rating') or 0
+        if not 0 <= data['rating'] <= 5:
+            raise ValidationError(_('Rating must be between 0 and 5.'))
+
+        currencies = [(key, name) for key, name, symbol in Price.CURRENCY_CHOICES]
+        data['currency'] = self.choice(row.get('currency'), currencies, 'EUR', 'currency')
+        data['price_source'] = self.choice(row.get('price_source'), Price.SOURCE_CHOICES, Price.PURCHASE, 'price_source')
+        for name in ['purchase_price', 'sale_price']:
+            data[name] = self.decimal(row.get(name), name, Price._meta.get_field(name))
+        data['purchase_date'] = self.date(row.get('purchase_date'), 'purchase_date')
+
+        return data
+
+    def exclude_existing(self, entries):
+        """
+        Skip rows whose ISBN or normalized title already exists, in the database or earlier in the file.
+        """
+        isbns = {data['isbn'] for line, data in entries}
+        titles = {normalize_text(data['title']) for line, data in entries}
+
+        # ISBNs are unique across all users
+        existing_isbns = set(Book.objects.filter(isbn__in=isbns).values_list('isbn', flat=True))
+        existing_titles = set(
+            Book.objects.filter(user=self.user, normalized_title__in=titles).values_list('normalized_title', flat=True)
+        )
+
+        kept = []
+        for line, data in entries:
+            title = normalize_text(data['title'])
+            if data['isbn'] in existing_isbns:
+                self.errors.append((line, _('A book with this isbn already exists!')))
+            elif title in existing_titles:
+                self.errors.append((line, _('A book with this title already exists!')))
+            else:
+                existing_isbns.add(data['isbn'])
+                existing_titles.add(title)
+                kept.append((line, data))
+
+        return kept
+
+    def exclude_volume_clashes(self, entries):
+        """
+        Skip rows whose volume number is taken in their collection, in the database or earlier in the file.
+        """
+        collections = self.cache[Collection]
+        volumes = {}
+        for line, data in entries:
+            collection = collections.get(normalize_text(data['collection']))
+            if collection and data['volume_number']:
+                volumes[line] = (collection.pk, data['volume_number'])
+
+        taken = set(
+            Book.objects.filter(
+                collection__in={pk for pk, number in volumes.values()},
+                volume_number__in={number for pk, number in volumes.values()},
+            ).values_list('collection', 'volume_number')
+        ) if volumes else set()
+
+        kept = []
+        for line, data in entries:
+            volume = volumes.get(line)
+            if volume in taken:
+                self.errors.append((line, _('Collection with this volume number already exists.')))
+                continue
+            if volume:
+                taken.add(volume)
+            kept.append((line, data))
+
+        return kept
+
+    def reset_cache(self):
+        # Related objects created by a rolled back transaction no longer exist
+        self.cache = {model: {} for name, model in self.related}
+
+    def resolve_related(self, rows):
+        # Look up, then create the missing related objects of the chunk, one query per step
+        for name, model in self.related:
+            cache = self.cache[model]
+            wanted = {}
+            for data in rows:
+                key = normalize_text(data[name])
+                if key and key not in cache:
+                    wanted.setdefault(key, data[name])
+
+            if not wanted:
+                continue
+
+            found = model.objects.filter(user=self.user, normalized_name__in=wanted)
+            cache.update({obj.normalized_name: obj for obj in found})
+
+            missing = [
+                model(name=value, normalized_name=key, user=self.user)
+                for key, value in wanted.items() if key not in cache
+            ]
+            if missing:
+                # Conflicting names are left out, e.g. genre names are unique across users
+                model.objects.bulk_create(missing, ignore_conflicts=True)
+                found = model.objects.filter(user=self.user, normalized_name__in=[obj.normalized_name for obj in missing])
+                cache.update({obj.normalized_name: obj for obj in found})
+
+    def build_book(self, data):
+        book = Book(
+            isbn=data['isbn'],
+            title=data['title'],
+            normalized_title=normalize_text(data['title']),
+            category=data['category'],
+            language=data['language'],
+            comments=data['comments'],
+            copyright=data['copyright'],
+            edition=data['edition'],
+            user=self.user,
+        )
+        for name, model in self.related:
+            setattr(book, name, self.cache[model].get(normalize_text(data[name])))
+
+        # A volume number is only kept for a book of a collection
+        if book.collection:
+            book.volume_number = data['volume_number']
+
+        return book
+
+    @staticmethod
+    def choice(value, choices, default, field):
+        if value in (None, ''):
+            return default
+
+        # Accept both the stored key and the display name
+        value = str(value)
+        for key, label in choices:
+            if value.lower() in (str(key).lower(), str(label).lower()):
+                return key
+
+        raise ValidationError(_('Invalid %(field)s: %(value)s') % {'field': field, 'value': value})
+
+    @staticmethod
+    def integer(value, field, model_field=None):
+        if value in (None, ''):
+            return None
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise ValidationError(_('Invalid %(field)s: %(value)s') % {'field': field, 'value': value})
+
+        # Within the range of the column, the database rejects the insert otherwise
+        if model_field is not None:
+            minimum, maximum = connection.ops.integer_field_range(model_field.get_internal_type())
+            if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+                raise ValidationError(_('Invalid %(field)s: %(value)s') % {'field': field, 'value': value})
+        return number
+
+    @staticmethod
+    def decimal(value, field, model_field=None):
+        if value in (None, ''):
+            return Decimal('0.00')
+        # Finite, and when given a model field with no more digits than its column holds
+        decimal_places = model_field.decimal_places if model_field is not None else 2
+        try:
+            number = Decimal(str(value))
+            if not number.is_finite():
+                raise InvalidOperation
+            number = number.quantize(Decimal(1).scaleb(-decimal_places))
+            if model_field is not None:
+                DecimalValidator(model_field.max_digits, decimal_places)(number)
+        except (InvalidOperation, ValidationError):
+            raise ValidationError(_('Invalid %(field)s: %(value)s') % {'field': field, 'value': value})
+        return number
+
+    @staticmethod
+    def date(value, field):
+        if value in (None, ''):
+            return None
+        try:
+            return date.fromisoformat(str(value))
+        except ValueError:
+            raise ValidationError(_('Invalid %(field)s: %(value)s') % {'field': field, 'value': value})
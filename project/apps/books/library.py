@@ -0,0 +1,90 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+# Application modules
+from apps.books.models import Book, Rating, Status, Price, LibraryEntry
+
+
+# Books refreshed per query
+CHUNK_SIZE = 500
+
+# Columns copied from the book and the owner's status, rating and price rows
+ENTRY_FIELDS = [
+    'user', 'isbn', 'title', 'author_name', 'genre_name', 'language', 'cover_image',
+    'status', 'rating', 'purchase_price', 'currency', 'modified',
+]
+
+
+def entry_rows(books):
+    """
+    Build the library entries of a queryset of books, with one query.
+    """
+    def owner_row(model):
+        return model.objects.filter(book=OuterRef('pk'), user=OuterRef('user')).order_by()
+
+    prices = owner_row(Price)
+    rows = books.order_by().values(
+        'pk', 'user_id', 'isbn', 'title', 'language', 'cover_image',
+        author_name=F('author__name'),
+        genre_name=F('genre__name'),
+        status=Subquery(owner_row(Status).values('status')[:1]),
+        rating=Subquery(owner_row(Rating).values('rating')[:1]),
+        purchase_price=Subquery(prices.values('purchase_price')[:1]),
+        currency=Subquery(prices.values('currency')[:1]),
+    )
+
+    return [
+        LibraryEntry(
+            book_id=row['pk'],
+            user_id=row['user_id'],
+            isbn=row['isbn'],
+            title=row['title'],
+            author_name=row['author_name'] or '',
+            genre_name=row['genre_name'] or '',
+            language=row['language'],
+            cover_image=row['cover_image'],
+            status=row['status'] or '',
+            rating=row['rating'] or 0,
+            purchase_price=row['purchase_price'],
+            currency=row['currency'] or '',
+        )
+        for row in rows
+    ]
+
+def write_entries(books):
+    # Insert or overwrite the entries of the books, one statement per chunk
+    entries = entry_rows(books)
+    for start in range(0, len(entries), CHUNK_SIZE):
+        LibraryEntry.objects.bulk_create(
+            entries[start:start + CHUNK_SIZE],
+            update_conflicts=True, unique_fields=['book'], update_fields=ENTRY_FIELDS,
+        )
+    return len(entries)
+
+def refresh_entries(book_ids):
+    """
+    Bring the library entries of the given books up to date once the current
+    transaction commits. Entries of deleted books go with them by cascade.
+    """
+    book_ids = list(book_ids)
+    if book_ids:
+        transaction.on_commit(lambda: _refresh(book_ids))
+
+def _refresh(book_ids):
+    for start in range(0, len(book_ids), CHUNK_SIZE):
+        write_entries(Book.objects.filter(pk__in=book_ids[start:start + CHUNK_SIZE]))
+
+def rebuild_entries(user=None):
+    """
+    Rewrite the library entries of a user, or of everyone, from the books.
+    """
+    books = Book.objects.all() if user is None else Book.objects.filter(user=user)
+    with transaction.atomic():
+        entries = LibraryEntry.objects.all() if user is None else LibraryEntry.objects.filter(user=user)
+        entries.exclude(book__in=books).delete()
+
+        count = 0
+        book_ids = list(books.values_list('pk', flat=True))
+        for start in range(0, len(book_ids), CHUNK_SIZE):
+            count += write_entries(Book.objects.filter(pk__in=book_ids[start:start + CHUNK_SIZE]))
+    return count
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+import json
+
+# Application modules
+from apps.books.benchmark import SIZES, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the pages of the books app against generated libraries of each size and write the results as JSON. '
+        'The libraries are created in the configured database on first use, run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Library sizes, in books per user.')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per page.')
+        parser.add_argument('--url-name', action='append', dest='names', help='Only time this URL name, repeatable.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the generated libraries.')
+        parser.add_argument('--output', default='benchmark.json', help='JSON report file.')
+
+    def handle(self, *args, **options):
+        report = run_benchmark(
+            sizes=options['sizes'],
+            repeat=options['repeat'],
+            names=options['names'],
+            seed=options['seed'],
+            stdout=self.stdout,
+        )
+
+        with open(options['output'], 'w') as file:
+            json.dump(report, file, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(f"{len(report['results'])} page timing(s) written to {options['output']}."))
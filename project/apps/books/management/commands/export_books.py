@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+import sys
+
+# Application modules
+from apps.books.exporters import FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = "Export a user's books as CSV, JSON Lines or a zip archive with the covers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Owner of the exported books.')
+        parser.add_argument('--format', choices=list(FORMATS), default='csv', help='Export format.')
+        parser.add_argument('--output', help='File to write, standard output by default.')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+
+        try:
+            for chunk in stream_export(user, options['format']):
+                output.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+# Application modules
+from apps.books.generators import LibraryGenerator
+
+
+class Command(BaseCommand):
+    help = 'Fill user libraries with synthetic books, authors, publishers, genres, collections and sections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000, help='Books created per user.')
+        parser.add_argument('--users', type=int, default=1, help='Users created, named <prefix>-1, <prefix>-2, ...')
+        parser.add_argument('--prefix', default='generated', help='Username prefix of the created users.')
+        parser.add_argument('--user', help='Fill the library of this existing user instead of creating users.')
+        parser.add_argument('--authors', type=int, help='Authors created per user, a tenth of the books by default.')
+        parser.add_argument('--publishers', type=int, help='Publishers created per user, one per 50 books by default.')
+        parser.add_argument('--genres', type=int, help='Genres created per user, 20 by default.')
+        parser.add_argument('--collections', type=int, help='Collections created per user, one per 100 books by default.')
+        parser.add_argument('--sections', type=int, help='Sections created per user, 10 by default.')
+        parser.add_argument('--seed', type=int, help='Random seed, for a reproducible library.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Books written per transaction.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['user']:
+            try:
+                users = [User.objects.get(username=options['user'])]
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+        else:
+            users = [
+                User.objects.get_or_create(username=f"{options['prefix']}-{i}")[0]
+                for i in range(1, options['users'] + 1)
+            ]
+
+        for user in users:
+            generator = LibraryGenerator(user, seed=options['seed'], chunk_size=options['chunk_size'])
+            created = generator.run(
+                options['books'],
+                authors=options['authors'],
+                publishers=options['publishers'],
+                genres=options['genres'],
+                collections=options['collections'],
+                sections=options['sections'],
+            )
+            self.stdout.write(self.style.SUCCESS(f"{created} book(s) generated for '{user.username}'."))
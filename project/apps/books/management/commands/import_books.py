@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+# Application modules
+from apps.books.importers import BookImporter, FORMATS, read_rows, format_from_name
+
+
+class Command(BaseCommand):
+    help = 'Import books for a user from a CSV, JSON or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Owner of the imported books.')
+        parser.add_argument('path', help='File to import.')
+        parser.add_argument('--format', choices=FORMATS, help='File format, taken from the extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows written per transaction.')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        format = options['format'] or format_from_name(options['path'])
+        importer = BookImporter(user, chunk_size=options['chunk_size'])
+
+        try:
+            with open(options['path'], 'rb') as stream:
+                importer.run(read_rows(stream, format))
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Import failed after {importer.created} book(s): {e}')
+
+        for line, error in importer.errors:
+            self.stderr.write(f'Row {line} skipped: {error}')
+
+        self.stdout.write(self.style.SUCCESS(f'{importer.created} book(s) imported, {len(importer.errors)} row(s) skipped.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from datetime import timedelta
+
+# Application modules
+from apps.books.sync import RETENTION, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete the tombstones of deleted objects older than the sync token retention.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=RETENTION.days, help='Keep the tombstones of this many days.')
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'{deleted} tombstone(s) deleted.'))
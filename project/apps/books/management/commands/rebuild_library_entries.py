@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+# Application modules
+from apps.books.library import rebuild_entries
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the library entries read by the library pages from the books, statuses, ratings and prices.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the entries of this username.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        count = rebuild_entries(user)
+        self.stdout.write(self.style.SUCCESS(f'{count} library entry(ies) rebuilt.'))
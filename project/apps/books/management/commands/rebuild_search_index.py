@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+# Application modules
+from apps.books.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Index every book again with the configured search backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only index the books of this username.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        backend = get_backend()
+        backend.rebuild(user=user)
+
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt with {type(backend).__name__}.'))
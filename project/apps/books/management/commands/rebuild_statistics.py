@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+# Application modules
+from apps.books.statistics import STATISTICS_TIMEOUT, compute_statistics, statistics_key
+
+
+class Command(BaseCommand):
+    help = 'Compute the library statistics of every user again and store them in the cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the statistics of this username.')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        count = 0
+        for user in users.iterator():
+            cache.set(statistics_key(user.pk), compute_statistics(user), STATISTICS_TIMEOUT)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Statistics rebuilt for {count} user(s).'))
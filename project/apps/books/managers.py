@@ -0,0 +1,79 @@
+from django.db import models
+from django.db.models import F, Q, FilteredRelation, Value, OuterRef, Subquery, Avg, Count, IntegerField
+from django.db.models.functions import Coalesce
+
+
+# Application managers
+class BookQuerySet(models.QuerySet):
+
+    def library_for(self, user, statuses=None, min_rating=None):
+        """
+        Return the books of a user annotated with the user's status and rating.
+        Status and rating are joined through their (user, book) rows instead of
+        correlated subqueries, so every library tab compiles to a single query.
+        """
+        queryset = self.filter(user=user).annotate(
+            user_status=FilteredRelation('statuses', condition=Q(statuses__user=user)),
+            user_rating=FilteredRelation('ratings', condition=Q(ratings__user=user)),
+        ).annotate(
+            status=Coalesce(F('user_status__status'), Value('')),
+            rating=Coalesce(F('user_rating__rating'), 0),
+        )
+
+        # Apply filters, books with status in the specified list
+        if statuses is not None:
+            queryset = queryset.filter(status__in=statuses)
+
+        # Apply filters, books rated at least with the given value
+        if min_rating is not None:
+            queryset = queryset.filter(rating__gte=min_rating)
+
+        return queryset
+
+    # --- Fetch profiles, what each page reads of a book in a fixed number of queries
+
+    def for_card(self, user, statuses=None, min_rating=None):
+        """
+        Library cards: the user's status and rating with author and genre, one query.
+        """
+        return self.library_for(user, statuses=statuses, min_rating=min_rating).select_related('author', 'genre')
+
+    def for_detail(self, user):
+        """
+        Book detail: related names, the user's status, rating and price rows, and the
+        rating average and count over all users, one query.
+        """
+        from apps.books.models import Rating
+
+        ratings = Rating.objects.filter(book=OuterRef('pk')).order_by().values('book')
+
+        return self.library_for(user).annotate(
+            user_price=FilteredRelation('prices', condition=Q(prices__user=user)),
+            average_rating=Subquery(ratings.annotate(value=Avg('rating')).values('value')),
+            rating_count=Subquery(ratings.annotate(value=Count('pk')).values('value'), output_field=IntegerField()),
+        ).select_related(
+            'author', 'publisher', 'genre', 'collection', 'section', 'user_status', 'user_price',
+        )
+
+
+BookManager = models.Manager.from_queryset(BookQuerySet)
+
+
+class LibraryEntryQuerySet(models.QuerySet):
+
+    def library_for(self, user, statuses=None, min_rating=None):
+        """
+        Return the library entries of a user, filtered as BookQuerySet.library_for filters books.
+        """
+        queryset = self.filter(user=user)
+
+        if statuses is not None:
+            queryset = queryset.filter(status__in=statuses)
+
+        if min_rating is not None:
+            queryset = queryset.filter(rating__gte=min_rating)
+
+        return queryset
+
+
+LibraryEntryManager = models.Manager.from_queryset(LibraryEntryQuerySet)
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_remove_volume_book_remove_volume_collection_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='normalized_title',
+            field=models.CharField(default='', editable=False, max_length=512),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='section',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:52
+
+from django.db import migrations
+from django.db.models import Count
+import re
+import unicodedata
+
+
+# Copy of apps.books.validators.normalize_text as of this migration,
+# later changes to it must not change what it does
+def normalize_text(text):
+    if not text:
+        return text
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r'[^\w\s]', '', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def deduplicate_keys(model, field_name, key_field):
+    """
+    Make the keys of rows that normalize to the same value unique for the
+    constraints of 0014. The oldest row keeps its key, the others get '#<id>'
+    appended, which normalize_text never produces. Nothing is merged or renamed,
+    the clashes are listed so that they can be renamed or merged by hand.
+    """
+    groups = (
+        model.objects.values('user', key_field).order_by()
+        .annotate(count=Count('pk')).filter(count__gt=1)
+    )
+    for group in groups:
+        rows = model.objects.filter(user=group['user'], **{key_field: group[key_field]}).order_by('pk')
+        kept, *others = rows.only('pk', field_name, key_field)
+        for obj in others:
+            setattr(obj, key_field, f"{group[key_field]}#{obj.pk}")
+            obj.save(update_fields=[key_field])
+            print(f"\n  {model.__name__} {obj.pk} '{getattr(obj, field_name)}' clashes with {kept.pk} '{getattr(kept, field_name)}'", end='')
+
+def backfill_normalized_keys(apps, schema_editor):
+    # Store the normalized key of every existing row, in batches
+    for model_name, field_name in [
+        ('Author', 'name'),
+        ('Publisher', 'name'),
+        ('Genre', 'name'),
+        ('Collection', 'name'),
+        ('Section', 'name'),
+        ('Book', 'title'),
+    ]:
+        model = apps.get_model('books', model_name)
+        key_field = f'normalized_{field_name}'
+        batch = []
+
+        for obj in model.objects.only('pk', field_name).iterator(chunk_size=2000):
+            setattr(obj, key_field, normalize_text(getattr(obj, field_name)) or '')
+            batch.append(obj)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, [key_field])
+                batch = []
+
+        if batch:
+            model.objects.bulk_update(batch, [key_field])
+
+        deduplicate_keys(model, field_name, key_field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_author_normalized_name_book_normalized_title_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_normalized_keys, migrations.RunPython.noop),
+    ]
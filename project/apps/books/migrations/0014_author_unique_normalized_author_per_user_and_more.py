@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_backfill_normalized_keys'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='author',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='unique_normalized_author_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_title'), name='unique_normalized_title_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='collection',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='unique_normalized_collection_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='genre',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='unique_normalized_genre_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='publisher',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='unique_normalized_publisher_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='section',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='unique_normalized_section_per_user'),
+        ),
+    ]
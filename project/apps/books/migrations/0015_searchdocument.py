@@ -0,0 +1,64 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:03
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+SEARCH_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(fields=['vector'], name='books_search_vector_gin'),
+    django.contrib.postgres.indexes.GinIndex(fields=['document'], name='books_search_document_trgm', opclasses=['gin_trgm_ops']),
+]
+
+
+def add_search_indexes(apps, schema_editor):
+    # GIN indexes only exist on PostgreSQL, other databases use another search backend
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    model = apps.get_model('books', 'SearchDocument')
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(model, index)
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    model = apps.get_model('books', 'SearchDocument')
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0014_author_unique_normalized_author_per_user_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Skipped by databases other than PostgreSQL
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='books.book')),
+                ('title', models.TextField(default='')),
+                ('names', models.TextField(default='')),
+                ('labels', models.TextField(default='')),
+                ('comments', models.TextField(default='')),
+                ('document', models.TextField(default='')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='searchdocument', index=index) for index in SEARCH_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(add_search_indexes, remove_search_indexes),
+            ],
+        ),
+    ]
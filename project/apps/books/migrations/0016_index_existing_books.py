@@ -0,0 +1,77 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:05
+
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from functools import reduce
+from operator import add
+
+import re
+import unicodedata
+
+
+# Copies of apps.books.search.base and normalize_text as of this migration,
+# later changes to them must not change what it does
+WEIGHTS = {
+    'title': 'A',
+    'names': 'B',
+    'labels': 'C',
+    'comments': 'D',
+}
+
+DOCUMENT_FIELDS = [
+    'pk', 'user_id', 'title', 'isbn', 'comments',
+    'author__name', 'publisher__name', 'genre__name', 'collection__name',
+]
+
+
+def normalize_text(text):
+    if not text:
+        return text
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r'[^\w\s]', '', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def build_document(values):
+    pk, user_id, title, isbn, comments, author, publisher, genre, collection = values
+    return {
+        'title': normalize_text(title) or '',
+        'names': ' '.join(filter(None, [normalize_text(author), isbn])),
+        'labels': ' '.join(filter(None, [normalize_text(publisher), normalize_text(genre), normalize_text(collection)])),
+        'comments': normalize_text(comments) or '',
+    }
+
+
+def index_existing_books(apps, schema_editor):
+    # Only the PostgreSQL backend keeps its documents in the database
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    Book = apps.get_model('books', 'Book')
+    SearchDocument = apps.get_model('books', 'SearchDocument')
+    vector = reduce(add, [SearchVector(field, weight=weight, config='simple') for field, weight in WEIGHTS.items()])
+    batch = []
+
+    for values in Book.objects.order_by().values_list(*DOCUMENT_FIELDS).iterator(chunk_size=2000):
+        fields = build_document(values)
+        document = ' '.join(filter(None, [fields['title'], fields['names'], fields['labels']]))
+        batch.append(SearchDocument(book_id=values[0], user_id=values[1], document=document, **fields))
+        if len(batch) >= 2000:
+            SearchDocument.objects.bulk_create(batch)
+            batch = []
+
+    if batch:
+        SearchDocument.objects.bulk_create(batch)
+
+    SearchDocument.objects.update(vector=vector)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_searchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_existing_books, migrations.RunPython.noop),
+    ]
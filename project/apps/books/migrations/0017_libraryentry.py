@@ -0,0 +1,83 @@
+# Generated by Django 5.1.1 on 2026-10-18 20:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def create_entries(apps, schema_editor):
+    # Same rows as apps.books.library.entry_rows, from the historical models
+    Book = apps.get_model('books', 'Book')
+    LibraryEntry = apps.get_model('books', 'LibraryEntry')
+
+    def owner_row(model_name):
+        model = apps.get_model('books', model_name)
+        return model.objects.filter(book=OuterRef('pk'), user=OuterRef('user')).order_by()
+
+    rows = Book.objects.order_by().values(
+        'pk', 'user_id', 'isbn', 'title', 'language', 'cover_image',
+        author_name=F('author__name'),
+        genre_name=F('genre__name'),
+        status=Subquery(owner_row('Status').values('status')[:1]),
+        rating=Subquery(owner_row('Rating').values('rating')[:1]),
+        purchase_price=Subquery(owner_row('Price').values('purchase_price')[:1]),
+        currency=Subquery(owner_row('Price').values('currency')[:1]),
+    )
+
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        batch.append(LibraryEntry(
+            book_id=row['pk'],
+            user_id=row['user_id'],
+            isbn=row['isbn'],
+            title=row['title'],
+            author_name=row['author_name'] or '',
+            genre_name=row['genre_name'] or '',
+            language=row['language'],
+            cover_image=row['cover_image'],
+            status=row['status'] or '',
+            rating=row['rating'] or 0,
+            purchase_price=row['purchase_price'],
+            currency=row['currency'] or '',
+        ))
+        if len(batch) >= 500:
+            LibraryEntry.objects.bulk_create(batch)
+            batch = []
+
+    if batch:
+        LibraryEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0016_index_existing_books'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryEntry',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='library_entry', serialize=False, to='books.book')),
+                ('isbn', models.CharField(max_length=13)),
+                ('title', models.CharField(max_length=255)),
+                ('author_name', models.CharField(default='', max_length=100)),
+                ('genre_name', models.CharField(default='', max_length=100)),
+                ('language', models.CharField(blank=True, max_length=7, null=True)),
+                ('cover_image', models.ImageField(default='book.png', null=True, upload_to='books/')),
+                ('status', models.CharField(default='', max_length=1)),
+                ('rating', models.PositiveSmallIntegerField(default=0)),
+                ('purchase_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('currency', models.CharField(default='', max_length=3)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['title'],
+                'indexes': [models.Index(fields=['user', 'status', 'title', 'book'], name='library_entry_status'), models.Index(fields=['user', 'title', 'book'], name='library_entry_title'), models.Index(fields=['user', '-rating', 'title', 'book'], name='library_entry_rating')],
+            },
+        ),
+        migrations.RunPython(create_entries, migrations.RunPython.noop),
+    ]
@@ -3,18 +3,17 @@ from django.urls import reverse
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator, FileExtensionValidator
-from django.core.files.base import ContentFile
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.conf.global_settings import LANGUAGES
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from datetime import datetime, date
-from PIL import Image
-from io import BytesIO
-from pathlib import Path
-import logging
 
 # Application modules
-from apps.books.validators import isbn13_validator, validate_unique_field, validate_file_size, validate_image
+from apps.books.validators import isbn13_validator, normalize_text, validate_unique_field, validate_file_size, validate_image
+from apps.books.managers import BookManager, LibraryEntryManager
+from apps.core.images import stash_upload, enqueue_thumbnail, register_image_field
 
 # *** Still to evaluate ***
 from django.core.files.storage import FileSystemStorage
@@ -35,6 +34,7 @@ class Author(models.Model):
             validate_image
         ])
     summary = models.TextField(_('Summary'), max_length=500, null=True, blank=True)
+    normalized_name = models.CharField(max_length=255, editable=False, default='')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
@@ -43,6 +43,7 @@ class Author(models.Model):
         ordering = ["name"]
         constraints = [
             models.UniqueConstraint(fields=['user', 'name'], name='unique_author_per_user'),
+            models.UniqueConstraint(fields=['user', 'normalized_name'], name='unique_normalized_author_per_user'),
         ]
 
     def clean(self):
@@ -70,61 +71,25 @@ class Author(models.Model):
                 raise ValidationError({'name': e.message})
 
     def save(self, *args, **kwargs):
-        # Generate the filename based on user and author name
-        filename = f"{self.user.id}_author_{self.id}.png"
-        filepath = Path(settings.MEDIA_ROOT, 'authors', filename)
-        logging.debug(f"Storage file path: {filepath}")
-
-        # Make sure the directory exists
-        if not filepath.parent.exists():
-            logging.error(f"Directory does not exist: {filepath.parent}")
-        
-        # Check if file exists before saving
-        if filepath.is_file():
-            logging.debug(f"File exists: {filepath}")
-        else:
-            logging.debug(f"File does not exist: {filepath}")
-        
-        # Check if a new image file has been uploaded
-        if not filename.lower() in self.headshot.name.lower():
-            # Delete existing file if it exists
-            if filepath.is_file():
-                filepath.unlink(missing_ok=True)
-
-            try:
-                logging.debug(f"Uploaded file: {self.headshot} - type {type(self.headshot)}")
-                # Open the uploaded image file
-                with Image.open(self.headshot) as img:
-                    # Set thumbnail size
-                    size = (200, 300)
-                    img.thumbnail(size)
-                    
-                    # Convert the image to PNG
-                    img_io = BytesIO()
-                    img.save(img_io, format='PNG')
-                    
-                    # Save the converted image back to the ImageField
-                    self.headshot.save(filename, ContentFile(img_io.getvalue()), save=False)
-
-            except (OSError, AttributeError, ValueError) as e:
-                logging.error(f"Cannot create thumbnail for {self.headshot.path}: {e}")
-                
-                # Fallback to a default image
-                with Image.open(Path(settings.MEDIA_ROOT, 'author.png')) as img:
-                    img.thumbnail(size)
-                    img_io = BytesIO()
-                    img.save(img_io, format='PNG')
-                    self.headshot.save(filename, ContentFile(img_io.getvalue()), save=False)
-        
+        # Keep the normalized name used by the uniqueness validation
+        self.normalized_name = normalize_text(self.name)
+
+        # Keep a new upload as-is, the thumbnail is produced by a background job
+        previous = stash_upload(self, 'headshot')
+
         # Save instance file path to database
         super().save(*args, **kwargs)
 
+        if previous is not None:
+            enqueue_thumbnail(self, 'headshot', default='author.png', rendition='headshot', previous=previous)
+
     def __str__(self):
         return self.name
     
 class Publisher(models.Model):
     name = models.CharField(_('Name'), max_length=100)
     description = models.TextField(_('Description'),max_length=500, null=True, blank=True)
+    normalized_name = models.CharField(max_length=255, editable=False, default='')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
@@ -132,7 +97,8 @@ class Publisher(models.Model):
     class Meta:
         ordering = ["name"]
         constraints = [
-            models.UniqueConstraint(fields=['user', 'name'], name='unique_publisher_per_user')
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_publisher_per_user'),
+            models.UniqueConstraint(fields=['user', 'normalized_name'], name='unique_normalized_publisher_per_user'),
         ]
 
     def clean(self):
@@ -147,19 +113,26 @@ class Publisher(models.Model):
             if 'name' in str(e):
                 raise ValidationError({'name': e.message})
 
+    def save(self, *args, **kwargs):
+        # Keep the normalized name used by the uniqueness validation
+        self.normalized_name = normalize_text(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
     
 class Genre(models.Model):
     name = models.CharField(_('Name'), max_length=100, unique=True, help_text="Enter a book genre (e.g. Science Fiction, Romance etc.)")
     description = models.TextField(_('Description'), max_length=1000, null=True, blank=True)
+    normalized_name = models.CharField(max_length=255, editable=False, default='')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
 
     class Meta:
         constraints = [
-            models.UniqueConstraint(fields=['user', 'name'], name='unique_genre_per_user')
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_genre_per_user'),
+            models.UniqueConstraint(fields=['user', 'normalized_name'], name='unique_normalized_genre_per_user'),
         ]
 
     def clean(self):
@@ -174,6 +147,11 @@ class Genre(models.Model):
             if 'name' in str(e):
                 raise ValidationError({'name': e.message})
 
+    def save(self, *args, **kwargs):
+        # Keep the normalized name used by the uniqueness validation
+        self.normalized_name = normalize_text(self.name)
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('genre-detail', args=[str(self.id)])
     
@@ -183,6 +161,7 @@ class Genre(models.Model):
 class Collection(models.Model):
     name = models.CharField(_('Name'), max_length=100)
     description = models.TextField(_('Description'), max_length=500, null=True, blank=True)
+    normalized_name = models.CharField(max_length=255, editable=False, default='')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
@@ -190,7 +169,8 @@ class Collection(models.Model):
     class Meta:
         ordering = ["name"]
         constraints = [
-            models.UniqueConstraint(fields=['user', 'name'], name='unique_collection_per_user')
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_collection_per_user'),
+            models.UniqueConstraint(fields=['user', 'normalized_name'], name='unique_normalized_collection_per_user'),
         ]
  
     def clean(self):
@@ -205,12 +185,18 @@ class Collection(models.Model):
             if 'name' in str(e):
                 raise ValidationError({'name': e.message})
     
+    def save(self, *args, **kwargs):
+        # Keep the normalized name used by the uniqueness validation
+        self.normalized_name = normalize_text(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 class Section(models.Model):
     name = models.CharField(_('Name'), max_length=100)
     description = models.TextField(_('Description'), max_length=500, null=True, blank=True)
+    normalized_name = models.CharField(max_length=255, editable=False, default='')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
@@ -218,7 +204,8 @@ class Section(models.Model):
     class Meta:
         ordering = ["name"]
         constraints = [
-            models.UniqueConstraint(fields=['user', 'name'], name='unique_section_per_user')
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_section_per_user'),
+            models.UniqueConstraint(fields=['user', 'normalized_name'], name='unique_normalized_section_per_user'),
         ]
 
     def clean(self):
@@ -233,6 +220,11 @@ class Section(models.Model):
             if 'name' in str(e):
                 raise ValidationError({'name': e.message})
     
+    def save(self, *args, **kwargs):
+        # Keep the normalized name used by the uniqueness validation
+        self.normalized_name = normalize_text(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -271,14 +263,18 @@ class Book(models.Model):
     collection = models.ForeignKey(Collection, verbose_name=_('Collection'), on_delete=models.RESTRICT, blank=True, null=True)
     volume_number = models.PositiveIntegerField(_('Volume Number'), null=True, blank=True)
     section = models.ForeignKey(Section, verbose_name=_('Section'), on_delete=models.SET_NULL, blank=True, null=True)
+    normalized_title = models.CharField(max_length=512, editable=False, default='')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
 
+    objects = BookManager()
+
     class Meta:
         ordering = ["title"]
         constraints = [
             models.UniqueConstraint(fields=['user', 'title'], name='unique_title_per_user'),
+            models.UniqueConstraint(fields=['user', 'normalized_title'], name='unique_normalized_title_per_user'),
             models.UniqueConstraint(fields=['user', 'isbn'], name='unique_isbn_per_user'),
             models.UniqueConstraint(fields=['collection', 'volume_number'], name='unique_volume_number_per_collection')
         ]
@@ -321,45 +317,17 @@ class Book(models.Model):
     def save(self, *args, **kwargs):
         # Convert the title to uppercase before saving
         self.title = self.title.upper()
+        # Keep the normalized title used by the uniqueness validation
+        self.normalized_title = normalize_text(self.title)
+
+        # Keep a new upload as-is, the thumbnail is produced by a background job
+        previous = stash_upload(self, 'cover_image')
 
-        # Generate the filename based on user and author name
-        filename = f"{self.user.id}_{self.isbn.replace(' ', '_').lower()}.png"
-        filepath = Path(settings.MEDIA_ROOT, 'books', filename)
-        logging.debug(f"Storage file path: {filepath}")
-        
-        # Check if a new image file has been uploaded
-        if not filename.lower() in self.cover_image.name.lower():
-            # Delete existing file if it exists
-            if filepath.is_file():
-                filepath.unlink(missing_ok=True)
-
-            try:
-                logging.debug(f"Uploaded file: {self.cover_image} - type {type(self.cover_image)}")
-                # Open the uploaded image file
-                with Image.open(self.cover_image) as img:
-                    # Set thumbnail size
-                    size = (200, 300)
-                    img.thumbnail(size)
-                    
-                    # Convert the image to PNG
-                    img_io = BytesIO()
-                    img.save(img_io, format='PNG')
-                    
-                    # Save the converted image back to the ImageField
-                    self.cover_image.save(filename, ContentFile(img_io.getvalue()), save=False)
-
-            except (OSError, AttributeError, ValueError) as e:
-                logging.error(f"Cannot create thumbnail for {self.cover_image.path}: {e}")
-                
-                # Fallback to a default image
-                with Image.open(Path(settings.MEDIA_ROOT, 'book.png')) as img:
-                    img.thumbnail(size)
-                    img_io = BytesIO()
-                    img.save(img_io, format='PNG')
-                    self.cover_image.save(filename, ContentFile(img_io.getvalue()), save=False)
-        
         # Save instance file path to database
         super().save(*args, **kwargs)
+
+        if previous is not None:
+            enqueue_thumbnail(self, 'cover_image', default='book.png', rendition='cover', previous=previous)
     
     def __str__(self):
         return self.title
@@ -477,3 +445,90 @@ class Status(models.Model):
     
     def __str__(self):
         return self.status
+
+
+class SearchDocument(models.Model):
+    # Normalized text of a book, by search weight, kept by the search backend
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    title = models.TextField(default='')
+    names = models.TextField(default='')
+    labels = models.TextField(default='')
+    comments = models.TextField(default='')
+    document = models.TextField(default='')
+    vector = SearchVectorField(null=True)
+
+    class Meta:
+        # Created on PostgreSQL only, see migration 0015
+        indexes = [
+            GinIndex(fields=['vector'], name='books_search_vector_gin'),
+            GinIndex(fields=['document'], opclasses=['gin_trgm_ops'], name='books_search_document_trgm'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+class LibraryEntry(models.Model):
+    """
+    Read model of the library pages, one row per book with the names, status,
+    rating and price of its owner copied in, so that a library tab is a scan of
+    one table. Kept up to date by apps.books.library, never written directly.
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='library_entry')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    isbn = models.CharField(max_length=13)
+    title = models.CharField(max_length=255)
+    author_name = models.CharField(max_length=100, default='')
+    genre_name = models.CharField(max_length=100, default='')
+    language = models.CharField(max_length=7, null=True, blank=True)
+    # The book's cover, not registered as a blob reference of its own
+    cover_image = models.ImageField(upload_to='books/', default='book.png', null=True)
+    status = models.CharField(max_length=1, default='')
+    rating = models.PositiveSmallIntegerField(default=0)
+    purchase_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    currency = models.CharField(max_length=3, default='')
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = LibraryEntryManager()
+
+    class Meta:
+        ordering = ["title"]
+        indexes = [
+            # One per library tab: status filters, all books by title, favorites by rating
+            models.Index(fields=['user', 'status', 'title', 'book'], name='library_entry_status'),
+            models.Index(fields=['user', 'title', 'book'], name='library_entry_title'),
+            models.Index(fields=['user', '-rating', 'title', 'book'], name='library_entry_rating'),
+        ]
+
+    @property
+    def id(self):
+        # Cards link to the book, as they did when rendered from books
+        return self.book_id
+
+    def get_dynamic_status_display(self):
+        return dict(Status.STATUS_CHOICES).get(self.status, "Unknown Status")
+
+    def __str__(self):
+        return self.title
+
+class Tombstone(models.Model):
+    """
+    Deleted object of a user, kept for the sync endpoint to report deletions.
+    Not a constraint on the user, the tombstones of a deleted user stay until pruned.
+    """
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    resource = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted']),
+        ]
+
+    def __str__(self):
+        return f'{self.resource} {self.object_id}'
+
+# Image fields stored as content-addressed blobs
+register_image_field(Author, 'headshot')
+register_image_field(Book, 'cover_image')
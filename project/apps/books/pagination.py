@@ -0,0 +1,199 @@
+from django.core import signing
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+
+# Keyset pagination
+class InvalidCursor(Exception):
+    pass
+
+class KeysetPage:
+    def __init__(self, paginator, object_list, next_values=None, previous_values=None):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.next_cursor = paginator.encode_cursor(next_values) if next_values else None
+        self.previous_cursor = paginator.encode_cursor(previous_values, reverse=True) if previous_values else None
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+class KeysetPaginator:
+    """
+    Paginate a queryset on the values of its ordering instead of an offset.
+    Each page is a range scan starting right after (or before) the row the
+    cursor points to, so the cost of a page does not depend on its depth.
+    The ordering fields must not be null, the primary key is appended to
+    make the ordering total.
+    """
+    salt = 'books.pagination.cursor'
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.per_page = int(per_page)
+        self.ordering = self.get_ordering(queryset, ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+
+    @staticmethod
+    def get_ordering(queryset, ordering=None):
+        ordering = list(ordering or queryset.query.order_by)
+        names = [field.lstrip('-') for field in ordering]
+
+        # Complete the ordering with the model default ordering and the primary key
+        for field in list(queryset.model._meta.ordering) + ['pk']:
+            name = field.lstrip('-')
+            if name not in names and not (name == 'pk' and 'id' in names):
+                ordering.append(field)
+                names.append(name)
+
+        return ordering
+
+    @cached_property
+    def count(self):
+        return self.queryset.count()
+
+    def encode_cursor(self, values, reverse=False):
+        return signing.dumps({'k': values, 'r': reverse}, salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=self.salt)
+            values, reverse = data['k'], data['r']
+        except (signing.BadSignature, KeyError, TypeError) as e:
+            raise InvalidCursor(_('Invalid cursor.')) from e
+
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor(_('Invalid cursor.'))
+
+        return values, reverse
+
+    def get_values(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def get_filter(self, values, reverse=False):
+        # Rows after the cursor: (a > x) or (a = x and b > y) or ...
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            term = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+            for previous, value in zip(self.ordering[:i], values[:i]):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    def get_page_queryset(self, cursor=None):
+        """
+        Return the query of a page, one row more than the page size to know if there is a next one.
+        """
+        if not cursor:
+            return self.queryset[:self.per_page + 1], None, False
+
+        values, reverse = self.decode_cursor(cursor)
+        queryset = self.queryset.filter(self.get_filter(values, reverse))
+
+        if reverse:
+            # Walk backwards from the cursor, the page order is restored in build_page
+            reversed_ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+            queryset = queryset.order_by(*reversed_ordering)
+
+        return queryset[:self.per_page + 1], values, reverse
+
+    def build_page(self, object_list, values=None, reverse=False):
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if values is None:
+            next_values = self.get_values(object_list[-1]) if has_more else None
+            return KeysetPage(self, object_list, next_values=next_values)
+
+        if reverse:
+            object_list = object_list[::-1]
+            previous_values = self.get_values(object_list[0]) if has_more else None
+            next_values = self.get_values(object_list[-1]) if object_list else values
+            return KeysetPage(self, object_list, next_values=next_values, previous_values=previous_values)
+
+        next_values = self.get_values(object_list[-1]) if has_more else None
+        previous_values = self.get_values(object_list[0]) if object_list else values
+        return KeysetPage(self, object_list, next_values=next_values, previous_values=previous_values)
+
+    def page(self, cursor=None):
+        queryset, values, reverse = self.get_page_queryset(cursor)
+        return self.build_page(list(queryset), values, reverse)
+
+    async def apage(self, cursor=None):
+        queryset, values, reverse = self.get_page_queryset(cursor)
+        return self.build_page([obj async for obj in queryset], values, reverse)
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin replacing offset pagination with keyset pagination.
+    Requests sent with 'X-Requested-With: XMLHttpRequest' get the rendered
+    page fragment and the next page URL as JSON, for infinite scrolling.
+    """
+    cursor_kwarg = 'cursor'
+    fragment_template_name = None
+
+    def paginate_queryset(self, queryset, page_size):
+        # A page read ahead by an async view
+        if getattr(self, 'paginated', None) is not None:
+            return self.paginated
+
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(e)
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """
+        Read a page with the async ORM, paginate_queryset then returns it.
+        """
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = await paginator.apage(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(e)
+        self.paginated = (paginator, page, page.object_list, page.has_other_pages())
+        return self.paginated
+
+    def get_page_url(self, cursor):
+        query = self.request.GET.copy()
+        query[self.cursor_kwarg] = cursor
+        return f'{self.request.path}?{query.urlencode()}'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context.get('page_obj')
+        if page is not None:
+            context['next_page_url'] = self.get_page_url(page.next_cursor) if page.has_next() else None
+            context['previous_page_url'] = self.get_page_url(page.previous_cursor) if page.has_previous() else None
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.headers.get('X-Requested-With') == 'XMLHttpRequest' and self.fragment_template_name:
+            response = JsonResponse({
+                'html': render_to_string(self.fragment_template_name, context, request=self.request),
+                'next': context.get('next_page_url'),
+            })
+        else:
+            response = super().render_to_response(context, **response_kwargs)
+
+        # Full pages and fragments share the same URL
+        patch_vary_headers(response, ['X-Requested-With'])
+        return response
@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    """
+    Return the search backend instance named by the BOOKS_SEARCH_BACKEND setting.
+    """
+    return import_string(settings.BOOKS_SEARCH_BACKEND)()
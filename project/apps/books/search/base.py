@@ -0,0 +1,86 @@
+# Application modules
+from apps.books.models import Book
+from apps.books.validators import normalize_text
+
+
+# Maximum number of ranked results returned by a search
+SEARCH_LIMIT = 500
+
+# Maximum number of terms taken from a query
+MAX_TERMS = 8
+
+# Searchable columns of a book document and their weight, A ranks highest
+WEIGHTS = {
+    'title': 'A',
+    'names': 'B',
+    'labels': 'C',
+    'comments': 'D',
+}
+
+# Book values a document is built from, in the order read by build_document()
+DOCUMENT_FIELDS = [
+    'pk', 'user_id', 'title', 'isbn', 'comments',
+    'author__name', 'publisher__name', 'genre__name', 'collection__name',
+]
+
+
+def get_terms(query):
+    """
+    Split a query into normalized terms, the way documents are normalized.
+    """
+    return (normalize_text(query or '') or '').split()[:MAX_TERMS]
+
+def build_document(values):
+    """
+    Map a row of DOCUMENT_FIELDS values to the normalized text of each weighted column.
+    """
+    pk, user_id, title, isbn, comments, author, publisher, genre, collection = values
+    return {
+        'title': normalize_text(title) or '',
+        'names': ' '.join(filter(None, [normalize_text(author), isbn])),
+        'labels': ' '.join(filter(None, [normalize_text(publisher), normalize_text(genre), normalize_text(collection)])),
+        'comments': normalize_text(comments) or '',
+    }
+
+def iter_documents(book_ids=None, user=None, chunk_size=2000):
+    """
+    Yield (book id, user id, document) for the given books, or all the books of a user.
+    """
+    queryset = Book.objects.all()
+    if book_ids is not None:
+        queryset = queryset.filter(pk__in=book_ids)
+    if user is not None:
+        queryset = queryset.filter(user=user)
+
+    for values in queryset.order_by().values_list(*DOCUMENT_FIELDS).iterator(chunk_size=chunk_size):
+        yield values[0], values[1], build_document(values)
+
+
+class BaseSearchBackend:
+    """
+    Search backend interface. Searches return book ids, best match first,
+    every query term has to match and the last one may be a word prefix.
+    """
+    def search(self, user, query, limit=SEARCH_LIMIT):
+        raise NotImplementedError
+
+    def suggest(self, user, query, limit=10):
+        return self.search(user, query, limit=limit)
+
+    def update(self, book_ids):
+        """
+        Index the current content of the given books.
+        """
+        raise NotImplementedError
+
+    def remove(self, book_ids, user_id=None):
+        """
+        Drop the given books from the index, user_id tells whose books they were when known.
+        """
+        raise NotImplementedError
+
+    def rebuild(self, user=None):
+        """
+        Index every book again, or every book of a user.
+        """
+        raise NotImplementedError
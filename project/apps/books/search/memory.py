@@ -0,0 +1,366 @@
+from django.conf import settings
+from django.db import transaction
+from array import array
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from pathlib import Path
+import difflib
+import json
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows, the index is then only locked within the process
+    fcntl = None
+
+# Application modules
+from apps.books.search.base import BaseSearchBackend, SEARCH_LIMIT, WEIGHTS, get_terms, iter_documents
+
+
+MAGIC = b'BOOKIDX1'
+
+# Posting bit of each weight, a posting is (book id << 4) | bits of the columns holding the term
+BITS = {'A': 8, 'B': 4, 'C': 2, 'D': 1}
+
+# Score of a posting by its highest bit, as ts_rank weighs A to D
+SCORES = {4: 1.0, 3: 0.4, 2: 0.2, 1: 0.1}
+
+# Score factor of a term matched as a prefix, or as a close spelling
+PREFIX_FACTOR = 0.5
+TYPO_FACTOR = 0.3
+
+
+class UserIndex:
+    """
+    Inverted index of the books of one user. The postings of a term are a
+    sorted array of 64-bit integers, read from a memory-mapped snapshot file
+    and copied to memory only once changed. Changes are appended to a journal
+    next to the snapshot, other processes replay it before searching.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix('.log')
+        self.lock_path = self.path.with_suffix('.lock')
+        self.clear()
+
+    def clear(self):
+        self.terms = {}       # term -> (offset, count) in the snapshot postings
+        self.overlay = {}     # term -> array, postings changed since the snapshot
+        self.docs = {}        # book id -> terms, to remove a book again
+        self.vocabulary = None
+        self.snapshot = None
+        self.journal_offset = 0
+        self.journal_entries = 0
+        self.close()
+
+    def close(self):
+        # The view on the mapped postings has to go before the mapping
+        if getattr(self, 'postings', None) is not None:
+            self.postings.release()
+        self.postings = memoryview(array('q'))
+        if getattr(self, 'mmap', None) is not None:
+            self.mmap.close()
+        self.mmap = None
+
+    # --- Postings
+    def get_postings(self, term):
+        if term in self.overlay:
+            return self.overlay[term]
+        location = self.terms.get(term)
+        if location is None:
+            return ()
+        offset, count = location
+        return self.postings[offset:offset + count]
+
+    def _writable(self, term):
+        postings = self.overlay.get(term)
+        if postings is None:
+            if term not in self.terms:
+                self.vocabulary = None
+            postings = self.overlay[term] = array('q', bytes(self.get_postings(term)))
+        return postings
+
+    def add(self, book_id, fields):
+        self.discard(book_id)
+
+        masks = {}
+        for column, text in fields.items():
+            for term in text.split():
+                masks[term] = masks.get(term, 0) | BITS[WEIGHTS[column]]
+
+        for term, mask in masks.items():
+            insort(self._writable(term), book_id << 4 | mask)
+        self.docs[book_id] = list(masks)
+
+    def discard(self, book_id):
+        for term in self.docs.pop(book_id, ()):
+            postings = self._writable(term)
+            i = bisect_left(postings, book_id << 4)
+            if i < len(postings) and postings[i] >> 4 == book_id:
+                del postings[i]
+
+    # --- Search
+    def get_vocabulary(self):
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.terms.keys() | self.overlay.keys())
+        return self.vocabulary
+
+    def expand(self, term):
+        # Terms starting with the query term, or failing that, close spellings of it
+        vocabulary = self.get_vocabulary()
+        matches = []
+        for candidate in vocabulary[bisect_left(vocabulary, term):]:
+            if not candidate.startswith(term):
+                break
+            matches.append((candidate, 1.0 if candidate == term else PREFIX_FACTOR))
+
+        if not matches:
+            matches = [(candidate, TYPO_FACTOR) for candidate in difflib.get_close_matches(term, vocabulary, n=3, cutoff=0.75)]
+        return matches
+
+    def search(self, terms, limit=SEARCH_LIMIT):
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for candidate, factor in self.expand(term):
+                for posting in self.get_postings(candidate):
+                    book_id = posting >> 4
+                    score = SCORES[(posting & 15).bit_length()] * factor
+                    if score > term_scores.get(book_id, 0):
+                        term_scores[book_id] = score
+
+            # Every term has to match
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {book_id: score + term_scores[book_id] for book_id, score in scores.items() if book_id in term_scores}
+            if not scores:
+                return []
+
+        return sorted(scores, key=lambda book_id: (-scores[book_id], book_id))[:limit]
+
+    # --- Storage
+    @contextmanager
+    def locked(self):
+        # Serialize journal appends and snapshot writes between processes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def sync(self):
+        """
+        Catch up with the files, reloading a new snapshot or replaying new journal entries.
+        """
+        try:
+            stat = self.path.stat()
+            snapshot = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            snapshot = None
+
+        if snapshot != self.snapshot:
+            self.load()
+
+        # The journal was emptied by a new snapshot meanwhile, start again from it
+        if not self.replay():
+            self.load()
+            self.replay()
+
+    def load(self):
+        self.clear()
+        try:
+            file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+
+        with file:
+            stat = os.fstat(file.fileno())
+            self.snapshot = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stat.st_size < len(MAGIC) + 8:
+                return
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            self.clear()
+            return
+
+        start = len(MAGIC) + 8
+        (size,) = struct.unpack('<Q', self.mmap[len(MAGIC):start])
+        header = json.loads(self.mmap[start:start + size])
+        self.terms = {term: tuple(location) for term, location in header['terms'].items()}
+        self.docs = {int(book_id): terms for book_id, terms in header['docs'].items()}
+
+        # The postings are read in place from the mapped file
+        offset = _aligned(start + size)
+        self.postings = memoryview(self.mmap)[offset:].cast('q')
+
+    def replay(self):
+        try:
+            journal = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return True
+
+        with journal:
+            # A journal shorter than what was read was emptied by a new snapshot
+            if os.fstat(journal.fileno()).st_size < self.journal_offset:
+                return False
+
+            journal.seek(self.journal_offset)
+            for line in journal:
+                # Skip a line still being written
+                if not line.endswith(b'\n'):
+                    break
+                self.apply(json.loads(line))
+                self.journal_offset += len(line)
+                self.journal_entries += 1
+
+        return True
+
+    def apply(self, entry):
+        if entry.get('f') is None:
+            self.discard(entry['id'])
+        else:
+            self.add(entry['id'], entry['f'])
+
+    def write(self, entries, compact_after):
+        """
+        Apply and journal a list of changes, {'id': book id, 'f': fields or None to remove}.
+        """
+        with self.locked():
+            self.sync()
+            with open(self.journal_path, 'ab') as journal:
+                for entry in entries:
+                    line = (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+                    journal.write(line)
+                    self.apply(entry)
+                    self.journal_offset += len(line)
+                    self.journal_entries += 1
+
+            if self.journal_entries >= compact_after:
+                self.save()
+
+    def save(self):
+        """
+        Write a snapshot of the index and empty the journal, to be called with the lock held.
+        """
+        terms = {}
+        data = array('q')
+        for term in self.get_vocabulary():
+            # No view on the mapped postings may outlive the loop, the mapping is closed below
+            postings = bytes(self.get_postings(term))
+            if postings:
+                terms[term] = (len(data), len(postings) // data.itemsize)
+                data.frombytes(postings)
+
+        header = json.dumps({
+            'terms': terms,
+            'docs': {str(book_id): terms for book_id, terms in self.docs.items()},
+        }, separators=(',', ':')).encode('utf-8')
+
+        start = len(MAGIC) + 8
+        padding = _aligned(start + len(header)) - start - len(header)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix('.tmp')
+        with open(temporary, 'wb') as file:
+            file.write(MAGIC + struct.pack('<Q', len(header)) + header + b'\0' * padding)
+            data.tofile(file)
+        os.replace(temporary, self.path)
+
+        open(self.journal_path, 'wb').close()
+        self.load()
+
+def _aligned(offset):
+    return (offset + 7) // 8 * 8
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Search backend for databases without full-text search, e.g. SQLite.
+    Each user gets an inverted index of normalized terms, stored in
+    BOOKS_SEARCH_INDEX_DIR and memory-mapped when first searched. Terms match
+    as word prefixes, a term matching nothing tries close spellings instead.
+    """
+    # Journal entries replayed on load before a new snapshot is written
+    compact_after = 1000
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or settings.BOOKS_SEARCH_INDEX_DIR)
+        self.indexes = {}
+        self.lock = threading.RLock()
+
+    def get_index(self, user_id):
+        index = self.indexes.get(user_id)
+        if index is None:
+            index = self.indexes[user_id] = UserIndex(self.directory / f'{user_id}.idx')
+        return index
+
+    def search(self, user, query, limit=SEARCH_LIMIT):
+        terms = get_terms(query)
+        if not terms:
+            return []
+
+        with self.lock:
+            index = self.get_index(user.pk)
+            index.sync()
+            return index.search(terms, limit)
+
+    def update(self, book_ids):
+        # Index what gets committed, a rolled back save leaves the index as it was
+        book_ids = list(book_ids)
+        transaction.on_commit(lambda: self._update(book_ids))
+
+    def remove(self, book_ids, user_id=None):
+        book_ids = list(book_ids)
+        transaction.on_commit(lambda: self._remove(book_ids, user_id))
+
+    def _update(self, book_ids):
+        changes = {}
+        for book_id, user_id, fields in iter_documents(book_ids=book_ids):
+            changes.setdefault(user_id, []).append({'id': book_id, 'f': fields})
+
+        with self.lock:
+            for user_id, entries in changes.items():
+                self.get_index(user_id).write(entries, self.compact_after)
+
+    def _remove(self, book_ids, user_id=None):
+        if user_id is not None:
+            user_ids = [user_id]
+        else:
+            user_ids = [int(path.stem) for path in self.directory.glob('*.idx')]
+
+        with self.lock:
+            for user_id in user_ids:
+                index = self.get_index(user_id)
+                index.sync()
+                entries = [{'id': book_id, 'f': None} for book_id in book_ids if book_id in index.docs]
+                if entries:
+                    index.write(entries, self.compact_after)
+
+    def rebuild(self, user=None):
+        documents = {}
+        for book_id, user_id, fields in iter_documents(user=user):
+            documents.setdefault(user_id, []).append((book_id, fields))
+
+        # Users without books anymore lose their index
+        if user is None:
+            user_ids = {int(path.stem) for path in self.directory.glob('*.idx')} | documents.keys()
+        else:
+            user_ids = {user.pk}
+
+        with self.lock:
+            for user_id in user_ids:
+                index = self.get_index(user_id)
+                with index.locked():
+                    index.clear()
+                    for book_id, fields in documents.get(user_id, []):
+                        index.add(book_id, fields)
+                    index.save()
@@ -0,0 +1,91 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import transaction
+from django.db.models import F
+from functools import reduce
+from itertools import islice
+from operator import add
+
+# Application modules
+from apps.books.models import SearchDocument
+from apps.books.search.base import BaseSearchBackend, SEARCH_LIMIT, WEIGHTS, get_terms, iter_documents
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Full-text search on a weighted tsvector with a GIN index. Each term is
+    matched as a word prefix and results are ranked with ts_rank, a query
+    without any match falls back on trigram word similarity (pg_trgm) over
+    the title, names and labels to tolerate typos.
+    """
+    # Text search configuration, without stemming or stop words for titles and names
+    config = 'simple'
+
+    # Documents written per statement
+    batch_size = 1000
+
+    def search(self, user, query, limit=SEARCH_LIMIT):
+        terms = get_terms(query)
+        if not terms:
+            return []
+
+        documents = SearchDocument.objects.filter(user=user)
+
+        # Terms are \w only after normalization, safe to join as a raw tsquery
+        tsquery = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=self.config)
+        ids = list(
+            documents.filter(vector=tsquery)
+            .annotate(rank=SearchRank(F('vector'), tsquery))
+            .order_by('-rank', 'pk')
+            .values_list('pk', flat=True)[:limit]
+        )
+        if ids:
+            return ids
+
+        # Nothing matched exactly, look for similar words
+        text = ' '.join(terms)
+        return list(
+            documents.filter(document__trigram_word_similar=text)
+            .annotate(rank=TrigramWordSimilarity(text, 'document'))
+            .order_by('-rank', 'pk')
+            .values_list('pk', flat=True)[:limit]
+        )
+
+    def update(self, book_ids):
+        self._index(iter_documents(book_ids=list(book_ids)))
+
+    def remove(self, book_ids, user_id=None):
+        SearchDocument.objects.filter(pk__in=list(book_ids)).delete()
+
+    def rebuild(self, user=None):
+        documents = SearchDocument.objects.all()
+        if user is not None:
+            documents = documents.filter(user=user)
+
+        with transaction.atomic():
+            documents.delete()
+            self._index(iter_documents(user=user))
+
+    def _index(self, rows):
+        vector = reduce(add, [SearchVector(field, weight=weight, config=self.config) for field, weight in WEIGHTS.items()])
+        rows = iter(rows)
+
+        while batch := list(islice(rows, self.batch_size)):
+            documents = [
+                SearchDocument(
+                    book_id=book_id,
+                    user_id=user_id,
+                    document=' '.join(filter(None, [fields['title'], fields['names'], fields['labels']])),
+                    **fields,
+                )
+                for book_id, user_id, fields in batch
+            ]
+
+            # Upsert the text columns, then compute the vectors of the batch in the database
+            with transaction.atomic():
+                SearchDocument.objects.bulk_create(
+                    documents,
+                    update_conflicts=True,
+                    unique_fields=['book'],
+                    update_fields=['user', 'document', *WEIGHTS],
+                )
+                SearchDocument.objects.filter(pk__in=[document.pk for document in documents]).update(vector=vector)
@@ -0,0 +1,266 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Application modules
+from apps.books.models import Book, Rating, Status, Price
+from apps.books.validators import normalize_text
+from apps.books.search import get_backend
+from apps.books.library import refresh_entries
+from apps.core.cache import bump_namespace
+
+
+# New books saved within batch_default_records(), waiting for their default records
+_default_records_batch = ContextVar('default_records_batch', default=None)
+
+
+# Application services
+def create_default_records(books):
+    """
+    Create the default rating, status and price of new books, one bulk insert per table.
+    """
+    if not books:
+        return
+
+    # Part of the caller's transaction when there is one, no savepoint needed
+    with transaction.atomic(savepoint=False):
+        Rating.objects.bulk_create([
+            Rating(book=book, user=book.user, rating=0)
+            for book in books
+        ])
+        Status.objects.bulk_create([
+            Status(book=book, user=book.user, status=Status.AVAILABLE)
+            for book in books
+        ])
+        Price.objects.bulk_create([
+            Price(book=book, user=book.user, currency='EUR', purchase_price=0.00, sale_price=0.00, price_source=Price.PURCHASE)
+            for book in books
+        ])
+
+@contextmanager
+def batch_default_records():
+    """
+    Collect the books saved within the block and create their default records
+    together when it ends without an error.
+    """
+    books = []
+    token = _default_records_batch.set(books)
+    try:
+        yield books
+    finally:
+        _default_records_batch.reset(token)
+    create_default_records(books)
+
+def queue_default_records(book):
+    """
+    Create the default records of a new book, or add it to the open batch.
+    """
+    batch = _default_records_batch.get()
+    if batch is None:
+        create_default_records([book])
+    else:
+        batch.append(book)
+
+def create_books(books, defaults=True):
+    """
+    Insert a list of new books with one bulk insert and, unless disabled, their default records.
+    Book.save() is not called, so cover uploads are not processed.
+    """
+    # As Book.save() does, titles are stored in uppercase
+    for book in books:
+        book.title = book.title.upper()
+        book.normalized_title = normalize_text(book.title)
+
+    with transaction.atomic():
+        books = Book.objects.bulk_create(books)
+        if defaults:
+            create_default_records(books)
+        get_backend().update([book.pk for book in books])
+        refresh_entries([book.pk for book in books])
+        for user_id in {book.user_id for book in books}:
+            bump_namespace(user_id)
+
+    return books
+
+def create_book(book):
+    """
+    Save a new book and its default records in one transaction.
+    """
+    with transaction.atomic(), batch_default_records():
+        book.save()
+
+    return book
+
+
+def _membership_values(field, target):
+    values = {field: target, 'modified': timezone.now()}
+    # A volume number only belongs to a book of a collection
+    if field == 'collection' and target is None:
+        values['volume_number'] = None
+    return values
+
+def set_members(user, field, target, book_ids):
+    """
+    Make the given books the only members of a section or collection, as two set-based UPDATEs.
+    Only books changing membership are written, saves and their side effects are skipped.
+    """
+    books = Book.objects.filter(user=user)
+    book_ids = list(book_ids)
+
+    with transaction.atomic():
+        if field == 'collection':
+            # Search documents include the collection name
+            changed = list(books.filter(Q(pk__in=book_ids) | Q(collection=target)).values_list('pk', flat=True))
+
+        added = books.filter(pk__in=book_ids).exclude(**{field: target}).update(**_membership_values(field, target))
+        removed = books.filter(**{field: target}).exclude(pk__in=book_ids).update(**_membership_values(field, None))
+
+        if field == 'collection':
+            get_backend().update(changed)
+
+    # Updates send no signals
+    if added or removed:
+        bump_namespace(user.pk)
+
+    return added, removed
+
+def change_members(user, field, target, add=(), remove=()):
+    """
+    Add and remove books from a section or collection, one UPDATE per direction.
+    """
+    books = Book.objects.filter(user=user)
+    added = removed = 0
+
+    with transaction.atomic():
+        if add:
+            added = books.filter(pk__in=add).exclude(**{field: target}).update(**_membership_values(field, target))
+        if remove:
+            removed = books.filter(pk__in=remove, **{field: target}).update(**_membership_values(field, None))
+
+        if field == 'collection':
+            # Search documents include the collection name
+            get_backend().update([*add, *remove])
+
+    # Updates send no signals
+    if added or removed:
+        bump_namespace(user.pk)
+
+    return added, removed
+
+
+# Fields of the user's price row a batch change may set
+PRICE_FIELDS = ['currency', 'purchase_price', 'purchase_date', 'sale_price', 'price_source']
+
+def clean_book_change(change):
+    """
+    Validate one batch change, {"book": id, "rating": 0-5, "status": key, "price": {...}}.
+    Returns the book id and the values per model, raises ValidationError.
+    """
+    from apps.books.importers import BookImporter
+
+    if not isinstance(change, dict):
+        raise ValidationError(_('A change must be an object.'))
+    book_id = BookImporter.integer(change.get('book'), 'book')
+    if book_id is None:
+        raise ValidationError(_('The book is required.'))
+
+    values = {}
+    if 'rating' in change:
+        # JSON true and false would pass as 1 and 0
+        if isinstance(change['rating'], bool):
+            raise ValidationError(_('Rating must be between 0 and 5.'))
+        rating = BookImporter.integer(change['rating'], 'rating')
+        if rating is None or not 0 <= rating <= 5:
+            raise ValidationError(_('Rating must be between 0 and 5.'))
+        values[Rating] = {'rating': rating}
+
+    if 'status' in change:
+        status = BookImporter.choice(change['status'], Status.STATUS_CHOICES, None, 'status')
+        if status is None:
+            raise ValidationError(_('The status is required.'))
+        values[Status] = {'status': status}
+
+    if 'price' in change:
+        price = change['price']
+        if not isinstance(price, dict) or not price.keys() <= set(PRICE_FIELDS):
+            raise ValidationError(_('A price may set %(fields)s.') % {'fields': ', '.join(PRICE_FIELDS)})
+        currencies = [(key, name) for key, name, symbol in Price.CURRENCY_CHOICES]
+        cleaners = {
+            'currency': lambda value: BookImporter.choice(value, currencies, 'EUR', 'currency'),
+            'purchase_price': lambda value: BookImporter.decimal(value, 'purchase_price', Price._meta.get_field('purchase_price')),
+            'purchase_date': lambda value: BookImporter.date(value, 'purchase_date'),
+            'sale_price': lambda value: BookImporter.decimal(value, 'sale_price', Price._meta.get_field('sale_price')),
+            'price_source': lambda value: BookImporter.choice(value, Price.SOURCE_CHOICES, Price.PURCHASE, 'price_source'),
+        }
+        values[Price] = {name: cleaners[name](value) for name, value in price.items()}
+
+    if not values:
+        raise ValidationError(_('Nothing to change, expected a rating, status or price.'))
+    return book_id, values
+
+def apply_book_changes(user, changes):
+    """
+    Apply a list of rating, status and price changes to the user's books in one
+    transaction: one query per model to read the rows, one bulk update and one
+    bulk insert for the missing ones. Returns a result per change, in order;
+    invalid changes are reported and skipped, the valid ones applied.
+    """
+    results = []
+    cleaned = []
+    for change in changes:
+        book = change.get('book') if isinstance(change, dict) else None
+        try:
+            book_id, values = clean_book_change(change)
+        except ValidationError as e:
+            results.append({'book': book, 'success': False, 'errors': e.messages})
+            continue
+        results.append({'book': book_id, 'success': True})
+        cleaned.append((len(results) - 1, book_id, values))
+
+    book_ids = set(Book.objects.filter(user=user, pk__in=[book_id for i, book_id, values in cleaned]).values_list('pk', flat=True))
+    for i, book_id, values in cleaned:
+        if book_id not in book_ids:
+            results[i] = {'book': book_id, 'success': False, 'errors': [_('Book not found.')]}
+    cleaned = [(i, book_id, values) for i, book_id, values in cleaned if book_id in book_ids]
+    if not cleaned:
+        return results
+
+    now = timezone.now()
+    with transaction.atomic():
+        for model in [Rating, Status, Price]:
+            # Later changes of the same book win
+            changed = {}
+            for i, book_id, values in cleaned:
+                if model in values:
+                    changed.setdefault(book_id, {}).update(values[model])
+            if not changed:
+                continue
+
+            rows = {row.book_id: row for row in model.objects.select_for_update().filter(user=user, book_id__in=changed)}
+            created = []
+            fields = set()
+            for book_id, values in changed.items():
+                row = rows.get(book_id)
+                if row is None:
+                    created.append(model(book_id=book_id, user=user, **values))
+                    continue
+                for name, value in values.items():
+                    setattr(row, name, value)
+                # bulk_update skips auto_now, the sync endpoint relies on modified
+                row.modified = now
+                fields.update(values)
+
+            if fields:
+                model.objects.bulk_update(list(rows.values()), [*fields, 'modified'], batch_size=500)
+            if created:
+                model.objects.bulk_create(created, batch_size=500)
+
+        # Bulk writes send no signals
+        refresh_entries([book_id for i, book_id, values in cleaned])
+        bump_namespace(user.pk)
+
+    return results
@@ -1,30 +1,104 @@
-from django.db.models.signals import post_save
+from django.db import connections, transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 # Application modules
-from apps.books.models import Book, Rating, Status, Price
+from apps.books.models import Book, Author, Publisher, Genre, Collection, Section, Rating, Status, Price, Tombstone
+from apps.books.api.resources import resource_for
+from apps.books.services import queue_default_records
+from apps.books.library import refresh_entries
+from apps.books.search import get_backend
+from apps.core.cache import bump_namespace
+from apps.core.images import image_processed
 
 
 # Applications sigmals
 @receiver(post_save, sender=Book)
-def create_default_rating(sender, instance, created, **kwargs):
-    if created:
-        Rating.objects.create(book=instance, user=instance.user, rating=0)
+def create_default_rows(sender, instance, created, raw, **kwargs):
+    # Fixture loads (raw) bring their own rows, batch_default_records() collects the others
+    if created and not raw:
+        queue_default_records(instance)
 
 @receiver(post_save, sender=Book)
-def create_default_status(sender, instance, created, **kwargs):
-    if created:
-        Status.objects.create(user=instance.user, book=instance, status='a')
+def index_book(sender, instance, raw, **kwargs):
+    if not raw:
+        get_backend().update([instance.pk])
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    get_backend().remove([instance.pk], user_id=instance.user_id)
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Publisher)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Collection)
+def index_related_books(sender, instance, created, raw, **kwargs):
+    # Book documents include the names of their author, publisher, genre and collection
+    if created or raw:
+        return
+    field = sender._meta.model_name
+    get_backend().update(Book.objects.filter(**{field: instance}).values_list('pk', flat=True))
 
 @receiver(post_save, sender=Book)
-def create_default_price(sender, instance, created, **kwargs):
-    if created:
-        # Create with default values
-        Price.objects.create(
-            book=instance,
-            currency='EUR',
-            purchase_price=0.00,
-            sale_price=0.00,
-            price_source=Price.PURCHASE,
-            user=instance.user
-        )
\ No newline at end of file
+def refresh_book_entry(sender, instance, raw, **kwargs):
+    if not raw:
+        refresh_entries([instance.pk])
+
+@receiver(post_save, sender=Status)
+@receiver(post_save, sender=Rating)
+@receiver(post_save, sender=Price)
+@receiver(post_delete, sender=Status)
+@receiver(post_delete, sender=Rating)
+@receiver(post_delete, sender=Price)
+def refresh_owner_entry(sender, instance, raw=False, **kwargs):
+    # Library entries copy the status, rating and price of the book owner
+    if not raw:
+        refresh_entries([instance.book_id])
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def refresh_related_entries(sender, instance, created, raw, **kwargs):
+    # Library entries copy the author and genre names
+    if created or raw:
+        return
+    field = sender._meta.model_name
+    refresh_entries(Book.objects.filter(**{field: instance}).values_list('pk', flat=True))
+
+@receiver(image_processed, sender=Book)
+def refresh_cover_entry(sender, object_id, **kwargs):
+    refresh_entries([object_id])
+
+def bump_user_namespace(sender, instance, **kwargs):
+    # Cached statistics and fragments of the user are stale
+    bump_namespace(instance.user_id)
+
+for model in [Book, Author, Publisher, Genre, Collection, Section, Status, Rating, Price]:
+    post_save.connect(bump_user_namespace, sender=model, dispatch_uid=f'bump_namespace_{model._meta.model_name}')
+    post_delete.connect(bump_user_namespace, sender=model, dispatch_uid=f'bump_namespace_{model._meta.model_name}')
+
+def record_tombstone(sender, instance, using, **kwargs):
+    # Deletions are reported by the sync endpoint, there is no row left to read them from
+    tombstone = Tombstone(user_id=instance.user_id, resource=resource_for(sender).name, object_id=instance.pk)
+    connection = connections[using]
+    if connection.in_atomic_block:
+        pending_tombstones(connection).append(tombstone)
+    else:
+        tombstone.save(using=using)
+
+def pending_tombstones(connection):
+    """
+    Return the tombstones of the current transaction, inserted together when it commits.
+    """
+    # One list per savepoint, its callback is dropped when the savepoint is rolled back
+    savepoint = tuple(connection.savepoint_ids)
+    batch = getattr(connection, 'tombstones_batch', None)
+    if batch is None or batch[0] != savepoint or not any(func is batch[2] for sids, func, robust in connection.run_on_commit):
+        tombstones = []
+        def insert():
+            Tombstone.objects.using(connection.alias).bulk_create(tombstones)
+        transaction.on_commit(insert, using=connection.alias)
+        batch = connection.tombstones_batch = (savepoint, tombstones, insert)
+    return batch[1]
+
+for model in [Book, Author, Publisher, Genre, Collection, Section, Status, Rating, Price]:
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'tombstone_{model._meta.model_name}')
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q, Sum
+
+# Application modules
+from apps.books.models import Book, Author, Price, Status
+from apps.core.cache import user_cache_key
+from apps.core.instrumentation import count_cache
+
+
+# Statuses and minimum rating of a favorite book
+FAVORITE_STATUSES = [Status.TO_READ, Status.AVAILABLE, Status.LOANED, Status.FOR_SALE]
+FAVORITE_MIN_RATING = 3
+
+# Cached statistics expire anyway after a day
+STATISTICS_TIMEOUT = 60 * 60 * 24
+
+
+def statistics_key(user_id):
+    return user_cache_key(user_id, 'statistics')
+
+def compute_statistics(user):
+    """
+    Aggregate the library statistics of a user, four queries.
+    """
+    library = Book.objects.library_for(user)
+
+    totals = library.aggregate(
+        books=Count('pk'),
+        favorites=Count('pk', filter=Q(status__in=FAVORITE_STATUSES, rating__gte=FAVORITE_MIN_RATING)),
+        average_rating=Avg('rating', filter=Q(rating__gt=0)),
+    )
+    by_status = {row['status']: row['count'] for row in library.order_by().values('status').annotate(count=Count('pk'))}
+    purchase_value = {
+        row['currency']: str(row['total'] or 0)
+        for row in Price.objects.filter(user=user, book__user=user).order_by().values('currency').annotate(total=Sum('purchase_price'))
+    }
+
+    return {
+        'books': totals['books'],
+        'by_status': by_status,
+        'favorites': totals['favorites'],
+        'authors': Author.objects.filter(user=user).count(),
+        'purchase_value': purchase_value,
+        'average_rating': round(totals['average_rating'], 2) if totals['average_rating'] is not None else None,
+    }
+
+def get_statistics(user):
+    """
+    Return the library statistics of a user from the cache, computing them on a miss.
+    Writes do not patch the cached values, they bump the user's cache namespace:
+    bulk paths bypass model signals, so patched counters would drift over time.
+    """
+    key = statistics_key(user.pk)
+    statistics = cache.get(key)
+    count_cache(hits=statistics is not None, misses=statistics is None)
+    if statistics is None:
+        statistics = compute_statistics(user)
+        cache.set(key, statistics, STATISTICS_TIMEOUT)
+    return statistics
+
+def count_books(statistics, statuses=None):
+    """
+    Number of books of a library tab, from the statistics.
+    """
+    if statuses is None:
+        return statistics['books']
+    return sum(statistics['by_status'].get(status, 0) for status in statuses)
@@ -0,0 +1,66 @@
+from django.core import signing
+from django.utils import timezone
+from datetime import datetime, timedelta
+
+# Application modules
+from apps.books.api.resources import RESOURCES
+from apps.books.models import Tombstone
+
+
+# Tombstones older than this are pruned, a client last synced before gets everything again
+RETENTION = timedelta(days=90)
+
+# Rows saved by transactions still running when a token is issued may carry an
+# earlier modified time, each sync reads again this far back. Upserts are idempotent.
+OVERLAP = timedelta(seconds=10)
+
+
+def make_token(moment):
+    return signing.dumps(moment.isoformat(), salt='books.sync.token', compress=True)
+
+def read_token(token):
+    """
+    Return the moment of a sync token, None for a missing, invalid or expired one.
+    """
+    if not token:
+        return None
+    try:
+        moment = datetime.fromisoformat(signing.loads(token, salt='books.sync.token'))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if moment < timezone.now() - RETENTION:
+        return None
+    return moment
+
+def changes_since(user, since=None):
+    """
+    Return the objects of a user saved after a moment, and those deleted
+    after it, by resource. Without a moment every object is returned.
+    """
+    now = timezone.now()
+    upserts = {}
+    for name, resource in RESOURCES.items():
+        queryset = resource.get_queryset(user)
+        if since is not None:
+            queryset = queryset.filter(modified__gt=since - OVERLAP)
+
+        fields = resource.get_fields()
+        rows = [resource.serialize(row, fields) for row in queryset.order_by('pk').values(*resource.lookups(fields))]
+        if rows:
+            upserts[name] = rows
+
+    deletes = {}
+    if since is not None:
+        tombstones = Tombstone.objects.filter(user=user, deleted__gt=since - OVERLAP).order_by('pk')
+        for resource, object_id in tombstones.values_list('resource', 'object_id'):
+            deletes.setdefault(resource, []).append(object_id)
+
+    return {
+        'token': make_token(now),
+        'full': since is None,
+        'upserts': upserts,
+        'deletes': deletes,
+    }
+
+def prune_tombstones(older_than=RETENTION):
+    return Tombstone.objects.filter(deleted__lt=timezone.now() - older_than).delete()[0]
@@ -1,3 +1,293 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from unittest import mock, skipUnless
+import json
+import tempfile
 
-# Create your tests here.
\ No newline at end of file
+# Application modules
+from apps.books.generators import LibraryGenerator, isbn13
+from apps.books.api.resources import RESOURCES
+from apps.books.importers import BookImporter
+from apps.books.models import Book, Collection, Rating, Price, Tombstone
+from apps.books.sync import changes_since, prune_tombstones
+from apps.books.pagination import KeysetPaginator, InvalidCursor
+from apps.core.testing import QueryBudgetMixin
+
+
+class LibraryTestCase(TestCase):
+    """
+    A user with a generated library of `books` books, logged in.
+    """
+    books = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='secret')
+        # Library entries are written once the transaction commits
+        with cls.captureOnCommitCallbacks(execute=True):
+            LibraryGenerator(cls.user, seed=0).run(cls.books)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+
+class KeysetPaginationTests(LibraryTestCase):
+    books = 23
+
+    def get_paginator(self):
+        return KeysetPaginator(Book.objects.filter(user=self.user), 5)
+
+    def test_pages_cover_every_book_once(self):
+        paginator = self.get_paginator()
+        seen = []
+        page = paginator.page()
+        while True:
+            seen.extend(book.pk for book in page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+
+        expected = list(Book.objects.filter(user=self.user).order_by('title', 'pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_page(self):
+        paginator = self.get_paginator()
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(list(paginator.page(second.previous_cursor)), list(first))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            self.get_paginator().page('not-a-cursor')
+        response = self.client.get(reverse('library_all'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_fragment(self):
+        response = self.client.get(reverse('book_list'), headers={'X-Requested-With': 'XMLHttpRequest'})
+        data = response.json()
+        self.assertIn('html', data)
+        self.assertIsNone(data['next'])
+
+
+class SearchBackendTestsMixin:
+    """
+    Matching and ranking expected from every search backend.
+    """
+    def get_backend(self):
+        raise NotImplementedError
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        other = User.objects.create_user('other')
+        cls.river = Book.objects.create(isbn=isbn13(1), title='The river', user=cls.user)
+        cls.song = Book.objects.create(isbn=isbn13(2), title='Mountain song', comments='A river crossing', user=cls.user)
+        cls.glass = Book.objects.create(isbn=isbn13(3), title='Glass house', user=cls.user)
+        cls.other_river = Book.objects.create(isbn=isbn13(4), title='The river', user=other)
+
+    def setUp(self):
+        self.backend = self.get_backend()
+        self.backend.rebuild()
+
+    def test_title_ranks_above_comments(self):
+        self.assertEqual(self.backend.search(self.user, 'river'), [self.river.pk, self.song.pk])
+
+    def test_last_term_is_a_prefix(self):
+        self.assertEqual(self.backend.search(self.user, 'glass hou'), [self.glass.pk])
+
+    def test_every_term_matches(self):
+        self.assertEqual(self.backend.search(self.user, 'river song'), [self.song.pk])
+
+    def test_typo_falls_back_on_similar_words(self):
+        self.assertEqual(self.backend.search(self.user, 'rivr')[0], self.river.pk)
+
+    def test_empty_query(self):
+        self.assertEqual(self.backend.search(self.user, '  '), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Full-text search needs PostgreSQL')
+class PostgresSearchBackendTests(SearchBackendTestsMixin, TestCase):
+    def get_backend(self):
+        from apps.books.search.postgres import PostgresSearchBackend
+        return PostgresSearchBackend()
+
+
+class InvertedIndexBackendTests(SearchBackendTestsMixin, TestCase):
+    def get_backend(self):
+        from apps.books.search.memory import InvertedIndexBackend
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return InvertedIndexBackend(directory.name)
+
+    def test_index_is_reloaded_from_disk(self):
+        # Another process reads the snapshot and the journal
+        with self.captureOnCommitCallbacks(execute=True):
+            self.backend.remove([self.glass.pk], self.user.pk)
+        reloaded = type(self.backend)(self.backend.directory)
+        self.assertEqual(reloaded.search(self.user, 'river'), [self.river.pk, self.song.pk])
+        self.assertEqual(reloaded.search(self.user, 'glass'), [])
+
+
+class QueryBudgetTests(QueryBudgetMixin, LibraryTestCase):
+    # More books than a page shows, the budgets must not grow with the library
+    books = 60
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    # Cold pages include the statistics and the queued renditions of the shared default images
+    def test_library_page(self):
+        self.assertViewQueries(13, reverse('library_all'))
+
+    def test_library_page_cached(self):
+        self.client.get(reverse('library_all'))
+        self.assertViewQueries(4, reverse('library_all'))
+
+    def test_book_detail(self):
+        book = Book.objects.filter(user=self.user).first()
+        self.assertViewQueries(10, reverse('book_detail', kwargs={'pk': book.pk}))
+
+
+class SyncTests(LibraryTestCase):
+    def sync(self, token=None):
+        response = self.client.get(reverse('api_sync'), {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_sync(self):
+        data = self.sync()
+        self.assertTrue(data['full'])
+        self.assertEqual(len(data['upserts']['books']), self.books)
+        self.assertEqual(data['deletes'], {})
+
+    def test_invalid_token_gets_a_full_sync(self):
+        self.assertTrue(self.sync('not-a-token')['full'])
+
+    def test_unchanged_objects_are_skipped(self):
+        earlier = timezone.now() - timedelta(hours=1)
+        for resource in RESOURCES.values():
+            resource.get_queryset(self.user).update(modified=earlier)
+        data = changes_since(self.user, timezone.now() - timedelta(minutes=30))
+        self.assertFalse(data['full'])
+        self.assertEqual(data['upserts'], {})
+
+    def test_deletions_leave_tombstones(self):
+        token = self.sync()['token']
+        book = Book.objects.filter(user=self.user).first()
+        book_id = book.pk
+        rating = Rating.objects.get(book=book, user=self.user)
+        # Tombstones are written once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+
+        data = self.sync(token)
+        self.assertFalse(data['full'])
+        self.assertEqual(data['deletes']['books'], [book_id])
+        # Rows deleted by cascade are reported too
+        self.assertEqual(data['deletes']['ratings'], [rating.pk])
+
+    def test_tombstones_of_other_users_are_hidden(self):
+        token = self.sync()['token']
+        other = User.objects.create_user('other')
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(isbn=isbn13(99), title='NOT MINE', user=other).delete()
+        self.assertEqual(self.sync(token)['deletes'], {})
+
+    def test_tombstones_are_inserted_together(self):
+        book = Book.objects.filter(user=self.user).first()
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        inserts = [query for query in queries if query['sql'].startswith('INSERT') and Tombstone._meta.db_table in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Tombstone.objects.count(), 4)
+
+    def test_rolled_back_deletions_leave_no_tombstones(self):
+        first, second = Book.objects.filter(user=self.user)[:2]
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                first.delete()
+                try:
+                    with transaction.atomic():
+                        second.delete()
+                        raise IntegrityError
+                except IntegrityError:
+                    pass
+        self.assertEqual(Tombstone.objects.filter(resource='books').count(), 1)
+
+    def test_prune(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(user=self.user).first().delete()
+        Tombstone.objects.update(deleted=timezone.now() - timedelta(days=365))
+        self.assertGreater(prune_tombstones(), 0)
+        self.assertFalse(Tombstone.objects.exists())
+
+
+class BatchViewTests(LibraryTestCase):
+    def post_changes(self, changes):
+        return self.client.post(reverse('api_batch'), json.dumps({'changes': changes}), content_type='application/json')
+
+    def test_invalid_change_is_reported_alone(self):
+        first, second = Book.objects.filter(user=self.user)[:2]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_changes([
+                {'book': first.pk, 'rating': 4},
+                {'book': second.pk, 'price': {'purchase_price': '1e20'}},
+            ])
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['applied'], 1)
+        self.assertEqual([result['success'] for result in data['results']], [True, False])
+        self.assertEqual(Rating.objects.get(book=first, user=self.user).rating, 4)
+        self.assertNotEqual(Price.objects.get(book=second, user=self.user).purchase_price, 10 ** 20)
+
+    def test_rating_rejects_booleans(self):
+        book = Book.objects.filter(user=self.user).first()
+        response = self.post_changes([{'book': book.pk, 'rating': True}])
+        self.assertEqual(response.json()['results'][0]['success'], False)
+
+    def test_books_of_other_users_are_not_found(self):
+        other = User.objects.create_user('other')
+        book = Book.objects.create(isbn='9780306406157', title='NOT MINE', user=other)
+        response = self.post_changes([{'book': book.pk, 'rating': 2}])
+        self.assertEqual(response.json()['applied'], 0)
+        self.assertFalse(Rating.objects.filter(book=book, rating=2).exists())
+
+
+class ImporterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+
+    def run_import(self, rows):
+        return BookImporter(self.user).run(
+            {'isbn': isbn13(number), 'title': f'BOOK {number}', **row} for number, row in enumerate(rows, start=1)
+        )
+
+    def test_volume_clashes_are_row_errors(self):
+        collection = Collection.objects.create(name='Saga', user=self.user)
+        Book.objects.create(isbn=isbn13(99), title='FIRST', collection=collection, volume_number=1, user=self.user)
+
+        importer = self.run_import([
+            {'collection': 'saga', 'volume_number': '1'},
+            {'collection': 'saga', 'volume_number': '2'},
+            {'collection': 'saga', 'volume_number': '2'},
+        ])
+        self.assertEqual(importer.created, 1)
+        self.assertEqual([line for line, error in importer.errors], [1, 3])
+
+    def test_integrity_errors_skip_only_their_row(self):
+        Book.objects.create(isbn=isbn13(2), title='TAKEN', user=self.user)
+
+        # Rows the checks let through, as when a book is added during the import
+        with mock.patch.object(BookImporter, 'exclude_existing', lambda self, entries: entries):
+            importer = self.run_import([{}, {}, {}])
+        self.assertEqual(importer.created, 2)
+        self.assertEqual([line for line, error in importer.errors], [2])
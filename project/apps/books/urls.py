@@ -10,10 +10,14 @@ urlpatterns = [
     path('library/loaned', views.LibraryLoanedListView.as_view(),name='library_loaned'),
     path('library/sale', views.LibrarySaleListView.as_view(),name='library_sale'),
     path('library/sold', views.LibrarySoldListView.as_view(),name='library_sold'),
+    path('library/search', views.LibrarySearchView.as_view(),name='library_search'),
+    path('library/search/suggest', views.LibrarySuggestView.as_view(),name='library_suggest'),
 
     path('books/', views.BookListView.as_view(),name='book_list'),
     path('book/<int:pk>/', views.BookDetailView.as_view(),name='book_detail'),
     path('book/add/', views.BookCreateView.as_view(),name='book_add'),
+    path('book/import/', views.BookImportView.as_view(),name='book_import'),
+    path('book/export/', views.BookExportView.as_view(),name='book_export'),
     path('book/update/<int:pk>/', views.BookUpdateView.as_view(),name='book_update'),
     path('book/delete/<int:pk>/', views.BookDeleteView.as_view(),name='book_delete'),
     path('book/<int:pk>/price/update/', views.PriceUpdateView.as_view(), name='price_update'),
@@ -45,6 +49,7 @@ urlpatterns = [
     path('section/update/<int:pk>/', views.SectionUpdateView.as_view(),name='section_update'),
     path('section/delete/<int:pk>/', views.SectionDeleteView.as_view(),name='section_delete'),
     path('section/<int:pk>/books', views.SectionBookSelectView.as_view(), name='section_book_select'),
+    path('section/<int:pk>/books/change', views.SectionBookChangeView.as_view(), name='section_book_change'),
 
     path('collections/', views.CollectionListView.as_view(),name='collection_list'),
     path('collection/<int:pk>/', views.CollectionDetailView.as_view(),name='collection_detail'),
@@ -52,4 +57,5 @@ urlpatterns = [
     path('collection/update/<int:pk>/', views.CollectionUpdateView.as_view(),name='collection_update'),
     path('collection/delete/<int:pk>/', views.CollectionDeleteView.as_view(),name='collection_delete'),
     path('collection/<int:pk>/books', views.CollectionBookSelectView.as_view(), name='collection_book_select'),
+    path('collection/<int:pk>/books/change', views.CollectionBookChangeView.as_view(), name='collection_book_change'),
 ]
\ No newline at end of file
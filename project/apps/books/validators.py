@@ -1,4 +1,4 @@
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, FieldDoesNotExist
 from django.utils.translation import gettext_lazy as _
 from pathlib import Path
 from datetime import datetime
@@ -60,25 +60,25 @@ def normalize_text(text):
 def validate_unique_field(model, field_name, value, user=None, instance=None):
     """
     Validates that the normalized value of the given field is unique within the model.
+    Fields with a persisted 'normalized_<field>' counterpart are compared on it,
+    other fields are compared on their exact value.
     Excludes the current instance (if provided) during updates.
     """
-    # Normalize the value
-    normalized_value = normalize_text(value)
+    # Look up the normalized key when the model stores one
+    key_field = f'normalized_{field_name}'
+    try:
+        model._meta.get_field(key_field)
+        lookup = {key_field: normalize_text(value)}
+    except FieldDoesNotExist:
+        lookup = {field_name: value}
 
     # Build the queryset
+    queryset = model.objects.filter(user=user, **lookup)
     if instance and instance.pk:
-        queryset = model.objects.filter(user=user).exclude(pk=instance.pk)
-    else:
-        queryset = model.objects.filter(user=user)
-
-    # Fetch and normalize all existing field values for this user
-    existing_values = queryset.values_list(field_name, flat=True)
-    normalized_existing_values = [
-        normalize_text(existing_value) for existing_value in existing_values
-    ]
+        queryset = queryset.exclude(pk=instance.pk)
 
     # Check if the normalized input value already exists
-    if normalized_value in normalized_existing_values:
+    if queryset.exists():
         raise ValidationError(_(f'A {model._meta.verbose_name} with this {field_name} already exists!'))
 
     return value
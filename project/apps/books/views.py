@@ -1,299 +1,167 @@
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, Http404
 from django.core.exceptions import PermissionDenied
-from django.views.generic import ListView
+from django.views.generic import ListView, View
 from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
 from django.views.generic.detail import DetailView
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from asgiref.sync import sync_to_async
 from django.utils.translation import gettext_lazy as _
+from django.utils import timezone
 from django.db import transaction, IntegrityError
-from django.db.models import OuterRef, Subquery, IntegerField, CharField, Value, Avg
-from django.db.models.functions import Coalesce
+from django.db.models import Case, When, Value, IntegerField
+import json
+import logging
 
 # Application modules
-from apps.books.models import Book, Author, Publisher, Genre, Section, Collection, Rating, Status, Price
-from apps.books.forms import BookForm, AuthorForm, PublisherForm, GenreForm, CollectionForm, SectionForm, PriceForm, RatingForm, StatusForm, BookSelectionForm
+from apps.books.models import Book, Author, Publisher, Genre, Section, Collection, Rating, Status, Price, LibraryEntry
+from apps.books.forms import BookForm, AuthorForm, PublisherForm, GenreForm, CollectionForm, SectionForm, PriceForm, RatingForm, StatusForm, BookSelectionForm, BookImportForm
+from apps.books.importers import BookImporter, read_rows, format_from_name
+from apps.books.services import create_book, set_members, change_members
+from apps.books.exporters import FORMATS as EXPORT_FORMATS, stream_export
 from apps.books.custom import star_range
+from apps.books.pagination import KeysetPaginationMixin
+from apps.books.search import get_backend
+from apps.books.statistics import FAVORITE_STATUSES, FAVORITE_MIN_RATING, get_statistics, count_books
+from apps.core.mixins import AsyncLoginRequiredMixin
+
+logger = logging.getLogger(__name__)
 
 # Application views
 
 # --- Library --- #
-class LibraryAllListView(LoginRequiredMixin, ListView):
-    model = Book
+class LibraryListView(AsyncLoginRequiredMixin, KeysetPaginationMixin, ListView):
+    model = LibraryEntry
     template_name = 'books/library_list.html'
+    fragment_template_name = 'books/library_cards.html'
     context_object_name = 'books'
-    
-    def get_queryset(self):
-        user = self.request.user
-
-        # Subquery to get the rating for each book for the current user
-        rating_subquery = Rating.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('rating')[:1]
-
-        # Subquery to get the status for each book for the current user
-        status_subquery = Status.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('status')[:1]
-
-        # Annotate each book with the user rating and book status
-        queryset = Book.objects.annotate(
-            rating=Coalesce(Subquery(rating_subquery, output_field=IntegerField()), 0),
-            status=Coalesce(Subquery(status_subquery, output_field=CharField()), Value(''))
-        )
-
-        # Apply filters, books with status in the specified list
-        queryset = queryset.filter(status__in=[ 't', 'a', 'r', 'l','f', 'n'])
+    paginate_by = 50
 
-        return queryset
-    
-    def get_context_data(self, **kwargs):
-        # Base context implementation 
-        context = super().get_context_data(**kwargs)
-        context['title'] = _('My Books')
-        return context
+    # Library tab filters, statuses shown and minimum user rating
+    title = None
+    statuses = None
+    min_rating = None
 
-class LibraryFavoritesListView(LoginRequiredMixin, ListView):
-    model = Book
-    template_name = 'books/library_list.html'
-    context_object_name = 'books'
-    
     def get_queryset(self):
-        user = self.request.user
-
-        # Subquery to get the rating for each book for the current user
-        rating_subquery = Rating.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('rating')[:1]
-
-        # Subquery to get the status for each book for the current user
-        status_subquery = Status.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('status')[:1]
-
-        # Annotate each book with the user rating and book status
-        queryset = Book.objects.annotate(
-            rating=Coalesce(Subquery(rating_subquery, output_field=IntegerField()), 0),
-            status=Coalesce(Subquery(status_subquery, output_field=CharField()), Value(''))
-        )
+        # Library tabs read the denormalized entries only, see apps.books.library
+        queryset = LibraryEntry.objects.library_for(self.request.user, statuses=self.statuses, min_rating=self.min_rating)
 
-        # Apply filters, books with rating >= 3 and status in the specified list
-        queryset = queryset.filter(rating__gte=3).order_by('-rating')
-        queryset = queryset.filter(status__in=['t', 'a', 'l', 'f'])
+        ordering = self.get_ordering()
+        if ordering:
+            queryset = queryset.order_by(*ordering)
 
         return queryset
-    
-    def get_context_data(self, **kwargs): 
-        context = super().get_context_data(**kwargs)
-        context['title'] = _('Favorites')
-        context['favorite_count'] = self.get_queryset().count()
-        return context
-
-class LibraryWishListView(LoginRequiredMixin, ListView):
-    model = Book
-    template_name = 'books/library_list.html'
-    context_object_name = 'books'
-    
-    def get_queryset(self):
-        user = self.request.user
-
-        # Subquery to get the rating for each book for the current user
-        rating_subquery = Rating.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('rating')[:1]
-
-        # Subquery to get the status for each book for the current user
-        status_subquery = Status.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('status')[:1]
 
-        # Annotate each book with the user rating and book status
-        queryset = Book.objects.annotate(
-            rating=Coalesce(Subquery(rating_subquery, output_field=IntegerField()), 0),
-            status=Coalesce(Subquery(status_subquery, output_field=CharField()), Value(''))
-        )
+    async def get(self, request, *args, **kwargs):
+        # The page is read with the async ORM; the search backend, the cached
+        # statistics and the fragment rendering are synchronous and run in a thread
+        self.object_list = await sync_to_async(self.get_queryset)()
+        await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        self.item_count = await sync_to_async(self.get_item_count)()
+        context = self.get_context_data()
+        return await sync_to_async(self.render_to_response)(context)
 
-        # Apply filters, books with status in the specified list
-        queryset = queryset.filter(status__in=['w'])
+    def get_item_count(self):
+        # Tab sizes come from the cached statistics instead of a COUNT query
+        return count_books(get_statistics(self.request.user), self.statuses)
 
-        return queryset
-    
     def get_context_data(self, **kwargs):
         # Base context implementation 
         context = super().get_context_data(**kwargs)
-        context["books"] = self.get_queryset()
-        context['title'] = _('Wishlist')
+        context['title'] = self.title
+        context['item_count'] = self.item_count
         return context
 
-class LibraryToReadListView(LoginRequiredMixin, ListView):
-    model = Book
-    template_name = 'books/library_list.html'
-    context_object_name = 'books'
-    
-    def get_queryset(self):
-        user = self.request.user
-
-        # Subquery to get the rating for each book for the current user
-        rating_subquery = Rating.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('rating')[:1]
+class LibraryAllListView(LibraryListView):
+    title = _('My Books')
+    statuses = [Status.TO_READ, Status.AVAILABLE, Status.RESERVED, Status.LOANED, Status.FOR_SALE, Status.NOT_FOUND]
 
-        # Subquery to get the status for each book for the current user
-        status_subquery = Status.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('status')[:1]
+class LibraryFavoritesListView(LibraryListView):
+    title = _('Favorites')
+    statuses = FAVORITE_STATUSES
+    min_rating = FAVORITE_MIN_RATING
+    ordering = ['-rating']
 
-        # Annotate each book with the user rating and book status
-        queryset = Book.objects.annotate(
-            rating=Coalesce(Subquery(rating_subquery, output_field=IntegerField()), 0),
-            status=Coalesce(Subquery(status_subquery, output_field=CharField()), Value(''))
-        )
+    def get_item_count(self):
+        return get_statistics(self.request.user)['favorites']
 
-        # Apply filters, books with status in the specified list
-        queryset = queryset.filter(status__in=['t'])
-
-        return queryset
-    
-    def get_context_data(self, **kwargs):
-        # Base context implementation 
+    def get_context_data(self, **kwargs): 
         context = super().get_context_data(**kwargs)
-        context["books"] = self.get_queryset()
-        context['title'] = _('To Read')
+        context['favorite_count'] = context['item_count']
         return context
 
-class LibraryLoanedListView(LoginRequiredMixin, ListView):
-    model = Book
-    template_name = 'books/library_list.html'
-    context_object_name = 'books'
-    
-    def get_queryset(self):
-        user = self.request.user
+class LibraryWishListView(LibraryListView):
+    title = _('Wishlist')
+    statuses = [Status.WHISH]
 
-        # Subquery to get the rating for each book for the current user
-        rating_subquery = Rating.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('rating')[:1]
+class LibraryToReadListView(LibraryListView):
+    title = _('To Read')
+    statuses = [Status.TO_READ]
 
-        # Subquery to get the status for each book for the current user
-        status_subquery = Status.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('status')[:1]
+class LibraryLoanedListView(LibraryListView):
+    title = _('Loaned')
+    statuses = [Status.LOANED]
 
-        # Annotate each book with the user rating and book status
-        queryset = Book.objects.annotate(
-            rating=Coalesce(Subquery(rating_subquery, output_field=IntegerField()), 0),
-            status=Coalesce(Subquery(status_subquery, output_field=CharField()), Value(''))
-        )
+class LibrarySaleListView(LibraryListView):
+    title = _('For sale')
+    statuses = [Status.FOR_SALE]
 
-        # Apply filters, books with status in the specified list
-        queryset = queryset.filter(status__in=['l'])
-
-        return queryset
-    
-    def get_context_data(self, **kwargs):
-        # Base context implementation 
-        context = super().get_context_data(**kwargs)
-        context["books"] = self.get_queryset()
-        context['title'] = _('Loaned')
-        return context
-
-class LibrarySaleListView(LoginRequiredMixin, ListView):
-    model = Book
-    template_name = 'books/library_list.html'
-    context_object_name = 'books'
-    
-    def get_queryset(self):
-        user = self.request.user
+class LibrarySoldListView(LibraryListView):
+    title = _('Sold')
+    statuses = [Status.SOLD]
 
-        # Subquery to get the rating for each book for the current user
-        rating_subquery = Rating.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('rating')[:1]
 
-        # Subquery to get the status for each book for the current user
-        status_subquery = Status.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('status')[:1]
+class LibrarySearchView(LibraryListView):
+    title = _('Search')
 
-        # Annotate each book with the user rating and book status
-        queryset = Book.objects.annotate(
-            rating=Coalesce(Subquery(rating_subquery, output_field=IntegerField()), 0),
-            status=Coalesce(Subquery(status_subquery, output_field=CharField()), Value(''))
-        )
-
-        # Apply filters, books with status in the specified list
-        queryset = queryset.filter(status__in=['f'])
-
-        return queryset
-    
-    def get_context_data(self, **kwargs):
-        # Base context implementation 
-        context = super().get_context_data(**kwargs)
-        context["books"] = self.get_queryset()
-        context['title'] = _('For sale')
-        return context   
-
-class LibrarySoldListView(LoginRequiredMixin, ListView):
-    model = Book
-    template_name = 'books/library_list.html'
-    context_object_name = 'books'
-    
     def get_queryset(self):
-        user = self.request.user
-
-        # Subquery to get the rating for each book for the current user
-        rating_subquery = Rating.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('rating')[:1]
+        self.query = self.request.GET.get('q', '').strip()
+        ids = self.ids = get_backend().search(self.request.user, self.query)
+        if not ids:
+            return LibraryEntry.objects.none()
 
-        # Subquery to get the status for each book for the current user
-        status_subquery = Status.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('status')[:1]
+        # Keep the backend ranking, as a value the keyset pagination can order by
+        ranking = Case(*[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)], output_field=IntegerField())
+        return LibraryEntry.objects.library_for(self.request.user).filter(pk__in=ids).annotate(search_rank=ranking).order_by('search_rank')
 
-        # Annotate each book with the user rating and book status
-        queryset = Book.objects.annotate(
-            rating=Coalesce(Subquery(rating_subquery, output_field=IntegerField()), 0),
-            status=Coalesce(Subquery(status_subquery, output_field=CharField()), Value(''))
-        )
+    def get_item_count(self):
+        return len(self.ids)
 
-        # Apply filters, books with status in the specified list
-        queryset = queryset.filter(status__in=['s'])
-
-        return queryset
-    
     def get_context_data(self, **kwargs):
-        # Base context implementation 
         context = super().get_context_data(**kwargs)
-        context["books"] = self.get_queryset()
-        context['title'] = _('Sold')
+        context['search_query'] = self.query
         return context
 
+class LibrarySuggestView(AsyncLoginRequiredMixin, View):
+    limit = 10
+
+    async def get(self, request, *args, **kwargs):
+        ids = await sync_to_async(get_backend().suggest)(request.user, request.GET.get('q', ''), limit=self.limit)
+        books = LibraryEntry.objects.library_for(request.user).filter(pk__in=ids).only('title', 'author_name')
+        books = sorted([book async for book in books], key=lambda book: ids.index(book.pk))
+
+        return JsonResponse({'results': [
+            {
+                'id': book.pk,
+                'title': book.title,
+                'author': book.author_name,
+                'url': reverse('book_detail', kwargs={'pk': book.pk}),
+            }
+            for book in books
+        ]})
 
 # --- Books --- #
-class BookListView(LoginRequiredMixin, ListView):
+class BookListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     login_url = "/login/"
     redirect_field_name = "redirect_to"
     
     model = Book
     context_object_name = 'books'
     template_name = 'books/book_list.html'
+    fragment_template_name = 'books/book_list_items.html'
+    paginate_by = 50
 
     def get_queryset(self):
         # Filter according to currently logged-in user
@@ -304,54 +172,32 @@ class BookListView(LoginRequiredMixin, ListView):
         # No need to reassign if context has not been modified
         return context
 
-class BookDetailView(LoginRequiredMixin, DetailView):
+class BookDetailView(AsyncLoginRequiredMixin, DetailView):
     model = Book
     template_name = 'books/book_detail.html'
     context_object_name = 'book'
 
-    def get_object(self, queryset=None):
-        user = self.request.user
-
-        # Subquery to get the purchase price for this book and the current user
-        price_subquery = Price.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).order_by('-created').values('purchase_price')[:1]
-
-        # Subquery to get the current status for this book and the current user
-        status_subquery = Status.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).order_by('-created').values('status')[:1]
-
-        # Annotate book with price and status
-        book = Book.objects.annotate(
-            price=Subquery(price_subquery),
-            status=Subquery(status_subquery),
-        ).get(pk=self.kwargs['pk'])
+    def get_queryset(self):
+        # The user's book with everything the page shows, see BookQuerySet.for_detail
+        return Book.objects.for_detail(self.request.user)
 
-        return book
+    async def get(self, request, *args, **kwargs):
+        try:
+            self.object = await self.get_queryset().aget(pk=self.kwargs['pk'])
+        except Book.DoesNotExist:
+            raise Http404(_('No book found matching the query'))
+        context = self.get_context_data(object=self.object)
+        # Rendered by the handler in a thread, once the view has returned
+        return self.render_to_response(context)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = self.request.user
         book = context['book']
-        
-        # Get the current user's rating for this book
-        rating = Rating.objects.filter(user=user, book=book).first()
 
-        # Calculate the average rating and number of ratings for the book
-        average_rating = book.ratings.aggregate(Avg('rating'))['rating__avg'] or 0
-        rating_count = book.ratings.count()
-
-        # Get the next URL if provided
-        next_url = self.request.GET.get('next', reverse('book_list'))
-    
         # Add data to context
-        context['book'].rating = rating.rating if rating else None
-        context['average_rating'] = round(average_rating, 2)
-        context['rating_count'] = rating_count
-        context['next_url'] = next_url
+        context['average_rating'] = round(book.average_rating or 0, 2)
+        context['rating_count'] = book.rating_count or 0
+        context['next_url'] = self.request.GET.get('next', reverse('book_list'))
         
         return context
  
@@ -371,10 +217,49 @@ class BookCreateView(LoginRequiredMixin, CreateView):
         # Assign the current user to the instance after form validation
         form.instance.user = self.request.user
 
+        # Save the book and its default rating, status and price in one transaction
+        self.object = create_book(form.instance)
+
         # Add a success message after the instance is successfully created
-        response = super().form_valid(form)
         messages.success(self.request, _('The book was updated successfully.'))
         
+        return redirect(self.get_success_url())
+
+class BookImportView(LoginRequiredMixin, FormView):
+    form_class = BookImportForm
+    template_name = 'books/book_import.html'
+    success_url = reverse_lazy('book_list')
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        format = form.cleaned_data['format'] or format_from_name(upload.name)
+
+        # Rows are read from the uploaded file as they are imported
+        try:
+            importer = BookImporter(self.request.user).run(read_rows(upload, format))
+        except ValueError as e:
+            form.add_error('file', _('The file could not be read: %(error)s') % {'error': e})
+            return self.form_invalid(form)
+
+        messages.success(self.request, _('%(count)d book(s) imported.') % {'count': importer.created})
+        for line, error in importer.errors[:10]:
+            messages.warning(self.request, _('Row %(line)d skipped: %(error)s') % {'line': line, 'error': error})
+        if len(importer.errors) > 10:
+            messages.warning(self.request, _('%(count)d more row(s) skipped.') % {'count': len(importer.errors) - 10})
+
+        return super().form_valid(form)
+
+class BookExportView(LoginRequiredMixin, View):
+    def get(self, request, *args, **kwargs):
+        format = request.GET.get('format', 'csv')
+        if format not in EXPORT_FORMATS:
+            raise Http404(_('Unsupported export format.'))
+
+        # Rows are fetched in chunks and sent as they are written
+        content_type, extension = EXPORT_FORMATS[format]
+        response = StreamingHttpResponse(stream_export(request.user, format), content_type=content_type)
+        filename = f"library-{timezone.localdate():%Y%m%d}.{extension}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
 class BookUpdateView(LoginRequiredMixin, UpdateView):
@@ -421,21 +306,24 @@ class BookDeleteView(LoginRequiredMixin, DeleteView):
         messages.success(self.request, _('The book was deleted successfully.'))
         return super(BookDeleteView,self).form_valid(form)
 
-class BookRatingUpdateView(LoginRequiredMixin, UpdateView):
-    model = Rating
-    form_class = RatingForm
-
-    def get_object(self, queryset=None):
-        book = get_object_or_404(Book, pk=self.kwargs['pk'])
-        rating, created = Rating.objects.get_or_create(book=book, user=self.request.user)
-        return rating
+class BookRatingUpdateView(AsyncLoginRequiredMixin, View):
+    """
+    Rate one of the user's books, answers in JSON. The form is part of the book page.
+    """
+    async def post(self, request, *args, **kwargs):
+        try:
+            book = await Book.objects.filter(user=request.user).aget(pk=self.kwargs['pk'])
+        except Book.DoesNotExist:
+            raise Http404(_('No book found matching the query'))
 
-    def form_valid(self, form):
-        self.object = form.save()
-        return JsonResponse({'success': True, 'rating': self.object.rating})
+        rating, created = await Rating.objects.aget_or_create(book=book, user=request.user)
+        # Model validation and the signal receivers refreshing the library entry are synchronous
+        form = RatingForm(request.POST, instance=rating)
+        if not await sync_to_async(form.is_valid)():
+            return JsonResponse({'success': False, 'errors': form.errors})
 
-    def form_invalid(self, form):
-        return JsonResponse({'success': False, 'errors': form.errors})
+        rating = await sync_to_async(form.save)()
+        return JsonResponse({'success': True, 'rating': rating.rating})
 
 class StatusUpdateView(LoginRequiredMixin, UpdateView):
     model = Status
@@ -790,6 +678,33 @@ class GenreDeleteView(LoginRequiredMixin, DeleteView):
             return redirect(self.success_url)
 
 
+# --- Membership --- #
+class BookMembershipChangeMixin:
+    """
+    JSON endpoint applying add/remove deltas to the books of a section or collection.
+    Expects a body like {"add": [1, 2], "remove": [3]} instead of the full selection.
+    """
+    model = None
+    field = None
+
+    def post(self, request, *args, **kwargs):
+        target = get_object_or_404(self.model, id=self.kwargs['pk'], user=request.user)
+
+        try:
+            data = json.loads(request.body)
+            add = [int(pk) for pk in data.get('add', [])]
+            remove = [int(pk) for pk in data.get('remove', [])]
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({'success': False, 'errors': _('Expected lists of book ids to add and remove.')}, status=400)
+
+        try:
+            added, removed = change_members(request.user, self.field, target, add=add, remove=remove)
+        except IntegrityError:
+            return JsonResponse({'success': False, 'errors': _('Collection with this volume number already exists.')}, status=409)
+
+        return JsonResponse({'success': True, 'added': added, 'removed': removed})
+
+
 # --- Collection --- #
 class CollectionListView(LoginRequiredMixin, ListView):
     model = Collection
@@ -817,24 +732,15 @@ class CollectionDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        collection = self.get_object()
-
-        # Subquery to get the status for each book for the current user
-        status_subquery = Status.objects.filter(
-            book=OuterRef('pk'),
-            user=user
-        ).values('status')[:1]
+        collection = self.object
 
-        # Annotate each book with the user rating and book status
-        books_queryset = Book.objects.filter(collection=collection).annotate(
-            status=Coalesce(Subquery(status_subquery, output_field=CharField()), Value(''))
-        )
+        # Books of the collection with the current user status
+        books_queryset = Book.objects.for_card(
+            user, statuses=[Status.TO_READ, Status.AVAILABLE, Status.LOANED, Status.FOR_SALE]
+        ).filter(collection=collection).order_by('volume_number')
 
-        # Apply filters to the books queryset
-        books_queryset = books_queryset.filter(status__in=['t', 'a', 'l', 'f']).order_by('volume_number')
-
-        # Add the filtered books to the context
-        context['books'] = books_queryset
+        # Add the filtered books to the context, evaluated once for the count and the list
+        context['books'] = list(books_queryset)
         return context
 
 class CollectionCreateView(LoginRequiredMixin, CreateView):
@@ -880,22 +786,16 @@ class CollectionUpdateView(LoginRequiredMixin, UpdateView):
 
     def form_invalid(self, form):
         response = super().form_invalid(form)
-        print(f"Form errors: {form.errors}")  # Debugging
-        # You can add additional logging or debugging information here
+        logger.debug('Collection form errors: %s', form.errors.as_json())
         return response
     
     def get_object(self, queryset=None):
         obj = super().get_object(queryset)
-        print(f"Loaded object: {obj}")
+        logger.debug('Loaded collection %s', obj.pk)
         if obj.user != self.request.user:
             raise PermissionDenied("You do not have permission to edit this collection.")
         return obj
 
-    def get_form(self, form_class=None):
-        form = super().get_form(form_class)
-        print(f"Form instance: {form.instance}")
-        return form
-
 class CollectionDeleteView(LoginRequiredMixin, DeleteView):
     model = Collection
     context_object_name = 'collection'
@@ -934,8 +834,8 @@ class CollectionBookSelectView(LoginRequiredMixin, FormView):
         context = super().get_context_data(**kwargs)
         collection = self.get_collection()
         
-        # Get all books that are already in this collection and belong to the current user
-        context['books_in_collection'] = Book.objects.filter(collection=collection, user=self.request.user)
+        # Ids of the books already in this collection and belonging to the current user
+        context['books_in_collection'] = set(Book.objects.filter(collection=collection, user=self.request.user).values_list('id', flat=True))
         context['collection'] = collection
         return context
 
@@ -954,18 +854,19 @@ class CollectionBookSelectView(LoginRequiredMixin, FormView):
         selected_books = form.cleaned_data['books']
         collection = self.get_collection()
 
-        # Add selected books to the collection
-        Book.objects.filter(id__in=[book.id for book in selected_books]).update(collection=collection)
-        
-        # If no books are selected, we should remove all books from the collection
-        if not selected_books:
-            Book.objects.filter(collection=collection, user=self.request.user).update(collection=None)
-        else:
-            # Remove books that are no longer in the collection
-            Book.objects.filter(collection=collection, user=self.request.user).exclude(id__in=[book.id for book in selected_books]).update(collection=None)
+        # Apply the difference with the current members, the selection becomes the collection
+        try:
+            set_members(self.request.user, 'collection', collection, [book.id for book in selected_books])
+        except IntegrityError:
+            form.add_error('books', _('Collection with this volume number already exists.'))
+            return self.form_invalid(form)
 
         return super().form_valid(form)
 
+class CollectionBookChangeView(LoginRequiredMixin, BookMembershipChangeMixin, View):
+    model = Collection
+    field = 'collection'
+
 
 # --- Section --- #
 class SectionListView(LoginRequiredMixin, ListView):
@@ -1078,8 +979,8 @@ class SectionBookSelectView(LoginRequiredMixin, FormView):
         context = super().get_context_data(**kwargs)
         section = self.get_section()
         
-        # Get all books that are already in this section and belong to the current user
-        context['books_in_section'] = Book.objects.filter(section=section, user=self.request.user)
+        # Ids of the books already in this section and belonging to the current user
+        context['books_in_section'] = set(Book.objects.filter(section=section, user=self.request.user).values_list('id', flat=True))
         context['section'] = section
         return context
 
@@ -1098,19 +999,11 @@ class SectionBookSelectView(LoginRequiredMixin, FormView):
         selected_books = form.cleaned_data['books']
         section = self.get_section()
 
-        # Add the selected books to the section
-        for book in selected_books:
-            book.section = section
-            book.save()
-
-        # If no books are selected, we should remove all books from the section
-        if not selected_books:
-            Book.objects.filter(section=section, user=self.request.user).update(section=None)
-        else:
-            # Remove books that were previously in the section but are not selected anymore
-            books_to_remove = Book.objects.filter(section=section, user=self.request.user).exclude(id__in=[book.id for book in selected_books])
-            for book in books_to_remove:
-                book.section = None
-                book.save()
+        # Apply the difference with the current members, the selection becomes the section
+        set_members(self.request.user, 'section', section, [book.id for book in selected_books])
 
         return super().form_valid(form)
+
+class SectionBookChangeView(LoginRequiredMixin, BookMembershipChangeMixin, View):
+    model = Section
+    field = 'section'
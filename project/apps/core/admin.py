@@ -1,3 +1,6 @@
 from django.contrib import admin
+from apps.core.models import ImageJob, ImageBlob
 
-# Register your models here.
+# Register model to Django Admin app
+admin.site.register(ImageJob)
+admin.site.register(ImageBlob)
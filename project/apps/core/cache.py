@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.db import transaction
+import time
+
+# Application modules
+from apps.core.instrumentation import count_cache
+
+
+# Per-user cache namespaces. Every key of a user embeds the current version
+# of the user's namespace, bumping the version orphans all of them at once,
+# the old entries are left to expire.
+
+def namespace_key(user_id):
+    return f'namespace:{user_id}'
+
+def _new_version():
+    # Unique across evictions of the version key, an old version is never reused
+    return time.time_ns() // 1000
+
+def get_namespace(user_id):
+    """
+    Return the current namespace version of a user.
+    """
+    key = namespace_key(user_id)
+    version = cache.get(key)
+    count_cache(hits=version is not None, misses=version is None)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+def bump_namespace(user_id):
+    """
+    Invalidate every cached entry of a user once the current transaction commits.
+    """
+    # Bumped before the commit, readers could cache the old rows under the new version
+    transaction.on_commit(lambda: _bump(user_id))
+
+def _bump(user_id):
+    key = namespace_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+def user_cache_key(user_id, *parts, version=None):
+    """
+    Build a cache key in the namespace of a user, pass version to skip its lookup.
+    """
+    if version is None:
+        version = get_namespace(user_id)
+    return ':'.join(['user', str(user_id), str(version), *map(str, parts)])
@@ -0,0 +1,44 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Connection pool statistics shown first, the others follow in psycopg_pool's order
+POOL_STATS = ['pool_min', 'pool_max', 'pool_size', 'pool_available', 'requests_waiting']
+
+
+def database_status(alias=DEFAULT_DB_ALIAS):
+    """
+    Connection settings of a database, the pool statistics of this process when
+    pooled, and on PostgreSQL the server's connections to the database by state.
+    """
+    connection = connections[alias]
+    settings_dict = connection.settings_dict
+    status = {
+        'alias': alias,
+        'vendor': connection.vendor,
+        'name': settings_dict['NAME'],
+        'host': settings_dict.get('HOST') or 'local',
+        'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+        'health_checks': settings_dict.get('CONN_HEALTH_CHECKS'),
+        'pool': None,
+        'server': None,
+        'max_connections': None,
+    }
+
+    # Only the PostgreSQL backend has a pool, and only with the pool option
+    pool = getattr(connection, 'pool', None)
+    if pool is not None:
+        stats = pool.get_stats()
+        status['pool'] = [(name, stats[name]) for name in POOL_STATS if name in stats]
+        status['pool'] += [(name, value) for name, value in stats.items() if name not in POOL_STATS]
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT coalesce(state, 'background'), count(*) FROM pg_stat_activity "
+                "WHERE datname = current_database() GROUP BY 1 ORDER BY 1"
+            )
+            status['server'] = cursor.fetchall()
+            cursor.execute('SHOW max_connections')
+            status['max_connections'] = int(cursor.fetchone()[0])
+
+    return status
@@ -0,0 +1,440 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete
+from django.dispatch import Signal
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+from PIL import Image
+from io import BytesIO
+import hashlib
+import logging
+
+# Application modules
+from apps.core.models import ImageJob, ImageBlob
+from apps.core.instrumentation import count_cache, timed_function
+
+
+# Raw uploads wait in this folder, below the field upload folder, until processed
+PENDING_DIR = 'pending'
+
+# Thumbnails are stored once per content, named after their digest
+BLOBS_DIR = 'blobs'
+
+# Thumbnail bounding box of covers, headshots and avatars
+THUMBNAIL_SIZE = (200, 300)
+
+# Rendition formats, file extension and content type
+FORMATS = {
+    'WEBP': ('webp', 'image/webp'),
+    'JPEG': ('jpg', 'image/jpeg'),
+}
+
+# Rendition registry, widths and formats generated next to each thumbnail
+RENDITIONS = {}
+
+# Image fields referencing blobs, {model: [field names]}
+IMAGE_FIELDS = {}
+
+# The renditions found for an image are remembered in the cache, all of them until
+# they are generated again or deleted, an incomplete set for this many seconds
+MISSING_RENDITIONS_TIMEOUT = 5 * 60
+
+# A running job not finished after this many seconds is taken to have lost its
+# worker and is claimed again, up to JOB_MAX_ATTEMPTS times
+JOB_TIMEOUT = 10 * 60
+JOB_MAX_ATTEMPTS = 3
+
+# A failed renditions job is retried after this many seconds instead of on every page view
+RENDITIONS_RETRY_AFTER = 24 * 3600
+
+# Sent with the model, object id and field name once a processed image replaced an upload
+image_processed = Signal()
+
+_executor = None
+
+
+# --- Renditions
+def register_rendition(name, widths, formats=('WEBP', 'JPEG')):
+    """
+    Register the widths and formats generated for a kind of image.
+    """
+    RENDITIONS[name] = {'widths': tuple(widths), 'formats': tuple(formats)}
+
+register_rendition('cover', widths=(100, 200))
+register_rendition('headshot', widths=(100, 200))
+register_rendition('avatar', widths=(40, 100, 200))
+
+def rendition_name(name, width, format):
+    """
+    Storage name of a rendition, e.g. books/1_9780000000002_100w.webp
+    """
+    path = PurePosixPath(name)
+    return str(path.with_name(f'{path.stem}_{width}w.{FORMATS[format][0]}'))
+
+def renditions_key(name):
+    return f"renditions:{hashlib.sha1(name.encode()).hexdigest()}"
+
+@timed_function('image')
+def make_rendition(file, width, format):
+    """
+    Reduce an image to the given width and return it encoded in the given format.
+    """
+    with Image.open(file) as img:
+        img.thumbnail((width, width * 10))
+        if format == 'JPEG' and img.mode != 'RGB':
+            # JPEG has no alpha channel, flatten on a white background
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            img = img.convert('RGBA')
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        img_io = BytesIO()
+        img.save(img_io, format=format, quality=80)
+        return img_io.getvalue()
+
+def generate_renditions(storage, name, rendition):
+    """
+    Generate the registered renditions of a stored image, replacing existing ones.
+    """
+    spec = RENDITIONS[rendition]
+    for width in spec['widths']:
+        for format in spec['formats']:
+            with storage.open(name) as file:
+                data = make_rendition(file, width, format)
+            target = rendition_name(name, width, format)
+            storage.delete(target)
+            storage.save(target, ContentFile(data))
+    cache.delete(renditions_key(name))
+
+@timed_function('image')
+def get_renditions(field_file, rendition):
+    """
+    Return the available renditions of an image field as {content type: [(url, width), ...]}.
+    Missing renditions are queued for generation and left out until they exist.
+    """
+    if not field_file or is_pending(field_file):
+        return {}
+
+    spec = RENDITIONS[rendition]
+    storage = field_file.storage
+    key = renditions_key(field_file.name)
+
+    # Storage and the job queue are only checked when the cache does not know the image
+    available = cache.get(key)
+    count_cache(hits=available is not None, misses=available is None)
+    if available is None:
+        available = [
+            (width, format)
+            for format in spec['formats'] for width in spec['widths']
+            if storage.exists(rendition_name(field_file.name, width, format))
+        ]
+        complete = len(available) == len(spec['formats']) * len(spec['widths'])
+        if not complete:
+            enqueue_renditions(field_file, rendition)
+        cache.set(key, available, None if complete else MISSING_RENDITIONS_TIMEOUT)
+
+    sources = {}
+    for width, format in available:
+        name = rendition_name(field_file.name, width, format)
+        sources.setdefault(FORMATS[format][1], []).append((storage.url(name), width))
+    return sources
+
+
+# --- Image processing
+@timed_function('image')
+def make_thumbnail(file, size=THUMBNAIL_SIZE):
+    """
+    Reduce an image to fit the given size and return it encoded as PNG.
+    """
+    with Image.open(file) as img:
+        img.thumbnail(size)
+        img_io = BytesIO()
+        img.save(img_io, format='PNG')
+        return img_io.getvalue()
+
+def is_pending(field_file):
+    """
+    Check if the file of an image field is a raw upload still waiting for its rendition.
+    """
+    return bool(field_file) and PurePosixPath(field_file.name).parent.name == PENDING_DIR
+
+def stash_upload(instance, field_name):
+    """
+    Store a new upload as-is in the pending folder, leaving the thumbnail to
+    a background job. Returns the image the field pointed at before the upload,
+    or None when there is no new upload.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file or field_file._committed:
+        return None
+
+    previous = ''
+    if instance.pk:
+        previous = type(instance).objects.filter(pk=instance.pk).values_list(field_name, flat=True).first() or ''
+
+    filename = PurePosixPath(field_file.name).name
+    field_file.save(str(PurePosixPath(PENDING_DIR, filename)), field_file.file, save=False)
+    return previous
+
+
+# --- Content-addressed storage
+def register_image_field(model, field_name):
+    """
+    Declare an image field storing blobs, so deleted rows release their blob
+    and the garbage collector knows where blobs are referenced.
+    """
+    IMAGE_FIELDS.setdefault(model, []).append(field_name)
+    post_delete.connect(_release_deleted, sender=model, dispatch_uid=f'release_blobs_{model._meta.label}')
+
+def blob_name(digest):
+    return str(PurePosixPath(BLOBS_DIR, digest[:2], f'{digest}.png'))
+
+def is_blob(name):
+    return bool(name) and PurePosixPath(name).parts[0] == BLOBS_DIR
+
+def store_blob(storage, data, source_digest='', rendition=''):
+    """
+    Store thumbnail bytes under their digest and return the blob.
+    Identical thumbnails are stored and get their renditions only once.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    blob, created = ImageBlob.objects.get_or_create(
+        digest=digest,
+        defaults={'name': blob_name(digest), 'source_digest': source_digest, 'size': len(data)},
+    )
+
+    if created or not storage.exists(blob.name):
+        storage.delete(blob.name)
+        storage.save(blob.name, ContentFile(data))
+
+        if rendition:
+            try:
+                generate_renditions(storage, blob.name, rendition)
+            except (OSError, ValueError) as e:
+                # Missing renditions are generated again on their first request
+                logging.error(f"Cannot create renditions for {blob.name}: {e}")
+
+    return blob
+
+def retain_blob(name):
+    if is_blob(name):
+        ImageBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, modified=timezone.now())
+
+def release_blob(name):
+    if is_blob(name):
+        ImageBlob.objects.filter(name=name).update(refcount=F('refcount') - 1)
+
+def count_references(name):
+    """
+    Count the rows of the registered image fields pointing at a blob.
+    """
+    return sum(
+        model._default_manager.filter(**{field_name: name}).count()
+        for model, field_names in IMAGE_FIELDS.items()
+        for field_name in field_names
+    )
+
+def collect_blobs(grace=3600, dry_run=False):
+    """
+    Delete the blobs no row references anymore, with their renditions.
+    Blobs used less than grace seconds ago are kept, a job may be about to reference them.
+    Returns the number of blobs deleted.
+    """
+    deleted = 0
+    threshold = timezone.now() - timezone.timedelta(seconds=grace)
+
+    for blob in ImageBlob.objects.filter(refcount__lte=0, modified__lt=threshold).iterator():
+        # Double check the counter before deleting anything
+        references = count_references(blob.name)
+        if references:
+            ImageBlob.objects.filter(pk=blob.pk).update(refcount=references)
+            continue
+
+        deleted += 1
+        if dry_run:
+            continue
+
+        for rendition in RENDITIONS.values():
+            for width in rendition['widths']:
+                for format in rendition['formats']:
+                    default_storage.delete(rendition_name(blob.name, width, format))
+        cache.delete(renditions_key(blob.name))
+        default_storage.delete(blob.name)
+        blob.delete()
+
+    return deleted
+
+def _release_deleted(sender, instance, **kwargs):
+    for field_name in IMAGE_FIELDS.get(sender, []):
+        release_blob(getattr(instance, field_name).name)
+
+
+# --- Jobs
+def enqueue_thumbnail(instance, field_name, default, rendition='', previous=''):
+    """
+    Create the job producing the thumbnail of a stashed upload, and its renditions.
+    The job runs in the process_images worker, or in a thread pool of the
+    current process when IMAGE_JOBS_MODE is 'thread'.
+    """
+    job = ImageJob.objects.create(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+        field_name=field_name,
+        kind=ImageJob.THUMBNAIL,
+        rendition=rendition,
+        source=getattr(instance, field_name).name,
+        default=default,
+        previous=previous,
+    )
+    _schedule(job)
+    return job
+
+def enqueue_renditions(field_file, rendition):
+    """
+    Create the job generating the renditions of a stored image, unless one is
+    already queued or one failed less than RENDITIONS_RETRY_AFTER seconds ago.
+    """
+    now = timezone.now()
+    active = ImageJob.objects.filter(source=field_file.name).filter(
+        Q(status=ImageJob.PENDING)
+        | Q(status=ImageJob.RUNNING, modified__gte=now - timezone.timedelta(seconds=JOB_TIMEOUT))
+        | Q(status=ImageJob.FAILED, modified__gte=now - timezone.timedelta(seconds=RENDITIONS_RETRY_AFTER))
+    )
+    if active.exists():
+        return None
+
+    job = ImageJob.objects.create(
+        content_type=ContentType.objects.get_for_model(field_file.instance),
+        object_id=field_file.instance.pk,
+        field_name=field_file.field.name,
+        kind=ImageJob.RENDITIONS,
+        rendition=rendition,
+        source=field_file.name,
+    )
+    _schedule(job)
+    return job
+
+def _schedule(job):
+    if getattr(settings, 'IMAGE_JOBS_MODE', 'queue') == 'thread':
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.pk))
+
+def claim_jobs(limit=10):
+    """
+    Mark up to limit pending jobs as running and return them, with the running
+    jobs whose worker went away, i.e. not finished within JOB_TIMEOUT seconds.
+    Rows locked by another worker are skipped.
+    """
+    now = timezone.now()
+    stale = Q(status=ImageJob.RUNNING, modified__lt=now - timezone.timedelta(seconds=JOB_TIMEOUT))
+
+    with transaction.atomic():
+        # Jobs that keep losing their worker, e.g. by crashing it, are given up
+        ImageJob.objects.filter(stale, attempts__gte=JOB_MAX_ATTEMPTS).update(
+            status=ImageJob.FAILED, error='Not finished after several attempts.', modified=now
+        )
+        jobs = list(
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=ImageJob.PENDING) | stale)
+            .order_by('created')[:limit]
+        )
+        # Updates skip auto_now, the claim time tells when a job went stale
+        ImageJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=ImageJob.RUNNING, attempts=F('attempts') + 1, modified=now
+        )
+    return jobs
+
+def process_job(job):
+    """
+    Produce the thumbnail of a job and point the model field at its blob.
+    When the upload cannot be decoded the field falls back to the default image.
+    """
+    model = job.content_type.model_class()
+    storage = model._meta.get_field(job.field_name).storage
+
+    if job.kind == ImageJob.RENDITIONS:
+        return process_renditions_job(job, storage)
+
+    try:
+        with storage.open(job.source) as file:
+            upload = file.read()
+        source_digest = hashlib.sha256(upload).hexdigest()
+
+        # Identical uploads reuse the stored thumbnail without decoding the image again
+        blob = ImageBlob.objects.filter(source_digest=source_digest).first()
+        if blob is None or not storage.exists(blob.name):
+            blob = store_blob(storage, make_thumbnail(BytesIO(upload)), source_digest, job.rendition)
+        name = blob.name
+
+    except (OSError, ValueError) as e:
+        logging.error(f"Cannot create thumbnail for {job.source}: {e}")
+        name = job.default
+        job.error = str(e)
+
+    # Only update the row if no newer upload replaced this one meanwhile
+    changes = {job.field_name: name}
+    if any(field.name == 'modified' for field in model._meta.fields):
+        changes['modified'] = timezone.now()
+
+    with transaction.atomic():
+        if model.objects.filter(pk=job.object_id, **{job.field_name: job.source}).update(**changes):
+            retain_blob(name)
+            release_blob(job.previous)
+            # Updates send no signals
+            image_processed.send(sender=model, object_id=job.object_id, field_name=job.field_name)
+
+    # The raw upload is no longer needed
+    storage.delete(job.source)
+
+    job.target = name
+    job.status = ImageJob.DONE if not job.error else ImageJob.FAILED
+    job.save(update_fields=['target', 'status', 'error', 'modified'])
+    return job
+
+def process_renditions_job(job, storage):
+    try:
+        generate_renditions(storage, job.source, job.rendition)
+    except (OSError, ValueError) as e:
+        logging.error(f"Cannot create renditions for {job.source}: {e}")
+        job.error = str(e)
+
+    job.status = ImageJob.DONE if not job.error else ImageJob.FAILED
+    job.save(update_fields=['status', 'error', 'modified'])
+    return job
+
+def process_pending(limit=10):
+    """
+    Claim and process a batch of pending jobs. Returns the number of jobs processed.
+    """
+    jobs = claim_jobs(limit)
+    for job in jobs:
+        try:
+            process_job(job)
+        except Exception as e:
+            logging.exception(f"Image job {job.pk} failed: {e}")
+            ImageJob.objects.filter(pk=job.pk).update(status=ImageJob.FAILED, error=str(e))
+    return len(jobs)
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'IMAGE_JOBS_THREADS', 2))
+    return _executor
+
+def _run_in_thread(job_pk):
+    try:
+        # Claim the job unless a worker already did
+        if ImageJob.objects.filter(pk=job_pk, status=ImageJob.PENDING).update(
+            status=ImageJob.RUNNING, attempts=F('attempts') + 1, modified=timezone.now()
+        ):
+            process_job(ImageJob.objects.get(pk=job_pk))
+    except Exception as e:
+        logging.exception(f"Image job {job_pk} failed: {e}")
+        ImageJob.objects.filter(pk=job_pk).update(status=ImageJob.FAILED, error=str(e))
+    finally:
+        # Database connections are per thread
+        connections.close_all()
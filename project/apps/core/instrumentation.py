@@ -0,0 +1,288 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import bisect
+import math
+import os
+import socket
+import threading
+import time
+
+
+# Metrics of the request being handled, None outside of a request
+_current = ContextVar('request_metrics', default=None)
+
+# Histogram buckets, upper bounds in milliseconds growing by 10% from 0.1 ms to about 10 minutes,
+# below them a bucket of its own for zero, e.g. requests without queries
+BUCKETS = [0.0] + [0.1 * 1.1 ** i for i in range(int(math.log(6_000_000) / math.log(1.1)) + 1)]
+
+# Timed metrics in the order of the Server-Timing header
+TIMINGS = ['total', 'db', 'template', 'image']
+
+PERCENTILES = (50, 95, 99)
+
+# Processes publish their histograms to the shared cache at most this often, in seconds
+PUBLISH_INTERVAL = 30
+PUBLISH_TIMEOUT = 24 * 3600
+
+
+class RequestMetrics:
+    """
+    Counters and timings of a single request, in milliseconds.
+    """
+    def __init__(self):
+        self.timings = dict.fromkeys(TIMINGS, 0.0)
+        self.queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add_time(self, name, elapsed):
+        self.timings[name] += elapsed * 1000
+
+    def server_timing(self):
+        entries = [f'{name};dur={self.timings[name]:.1f}' for name in TIMINGS]
+        entries.append(f'queries;desc="{self.queries}"')
+        entries.append(f'cache;desc="hits={self.cache_hits} misses={self.cache_misses}"')
+        return ', '.join(entries)
+
+
+# --- Recording, no-ops outside of a request
+@contextmanager
+def timed(name):
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_time(name, time.perf_counter() - start)
+
+def timed_function(name):
+    """
+    Decorator adding the duration of each call to a timed metric of the request.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count_cache(hits=0, misses=0):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+def _query_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_time('db', time.perf_counter() - start)
+        metrics.queries += 1
+
+@receiver(connection_created)
+def install_query_wrapper(sender, connection, **kwargs):
+    # Installed for the life of each connection rather than per request, async views query
+    # from a worker thread whose connection the request never sees. The context variable
+    # follows the request there, outside of one the wrapper only calls through.
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+# --- Histograms
+class Histogram:
+    """
+    Latency histogram with fixed logarithmic buckets, percentiles are within 10%.
+    Histograms of other processes merge by adding their bucket counts.
+    """
+    def __init__(self, counts=None, total=0.0):
+        self.counts = counts or {}
+        self.total = total
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def add(self, value):
+        i = bisect.bisect_left(BUCKETS, value)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.total += value
+
+    def merge(self, other):
+        for i, count in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + count
+        self.total += other.total
+
+    def percentile(self, percent):
+        count = self.count
+        if not count:
+            return None
+        rank = math.ceil(count * percent / 100)
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return BUCKETS[min(i, len(BUCKETS) - 1)]
+
+    def to_dict(self):
+        return {'counts': {str(i): count for i, count in self.counts.items()}, 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({int(i): count for i, count in data['counts'].items()}, data['total'])
+
+
+class MetricsRegistry:
+    """
+    Histograms of the requests handled by this process, per URL name and metric.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.published = time.monotonic()
+
+    def record(self, view, metrics):
+        values = dict(metrics.timings, queries=metrics.queries, cache_misses=metrics.cache_misses)
+        with self.lock:
+            histograms = self.histograms.setdefault(view, {})
+            for name, value in values.items():
+                histograms.setdefault(name, Histogram()).add(value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                view: {name: histogram.to_dict() for name, histogram in histograms.items()}
+                for view, histograms in self.histograms.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    # Publishing to the shared cache, for the metrics of every process
+    def process_key(self):
+        return f'request-metrics:{socket.gethostname()}:{os.getpid()}'
+
+    def publish(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.published < PUBLISH_INTERVAL:
+            return
+        self.published = now
+
+        key = self.process_key()
+        cache.set(key, self.snapshot(), PUBLISH_TIMEOUT)
+        keys = cache.get('request-metrics:processes') or []
+        if key not in keys:
+            cache.set('request-metrics:processes', keys + [key], PUBLISH_TIMEOUT)
+
+registry = MetricsRegistry()
+
+
+def collect(include_published=True):
+    """
+    Merge the histograms of this process with those published by the others.
+    """
+    snapshots = [registry.snapshot()]
+    if include_published:
+        own = registry.process_key()
+        keys = [key for key in cache.get('request-metrics:processes') or [] if key != own]
+        snapshots.extend(cache.get_many(keys).values())
+
+    merged = {}
+    for snapshot in snapshots:
+        for view, histograms in snapshot.items():
+            for name, data in histograms.items():
+                merged.setdefault(view, {}).setdefault(name, Histogram()).merge(Histogram.from_dict(data))
+    return merged
+
+def summarize(histograms):
+    """
+    Return {view: {metric: {'count', 'mean', 'p50', 'p95', 'p99'}}} sorted by view.
+    """
+    summary = {}
+    for view in sorted(histograms):
+        summary[view] = {}
+        for name, histogram in histograms[view].items():
+            count = histogram.count
+            row = {'count': count, 'mean': histogram.total / count if count else None}
+            row.update({f'p{percent}': histogram.percentile(percent) for percent in PERCENTILES})
+            summary[view][name] = row
+    return summary
+
+
+# --- Middleware
+class RequestMetricsMiddleware:
+    """
+    Record the wall time, queries, cache hits and misses, template rendering and
+    image processing time of each request. The totals are aggregated per URL
+    name and sent as a Server-Timing header to staff users, or to all when DEBUG.
+    Runs in the mode of the handler, so that async views stay async under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.add_time('total', time.perf_counter() - start)
+            _current.reset(token)
+
+        user = getattr(request, 'user', None)
+        return self.finish(request, response, metrics, user)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.add_time('total', time.perf_counter() - start)
+            _current.reset(token)
+
+        # request.user would query the session from the event loop
+        user = await request.auser() if hasattr(request, 'auser') and not settings.DEBUG else None
+        return self.finish(request, response, metrics, user)
+
+    def finish(self, request, response, metrics, user):
+        match = request.resolver_match
+        view = match.view_name if match and match.view_name else 'unresolved'
+        registry.record(view, metrics)
+        registry.publish()
+
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = metrics.server_timing()
+        return response
+
+    def process_template_response(self, request, response):
+        # Template responses render after the view returns, time them from here
+        metrics = _current.get()
+        if metrics is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda response: metrics.add_time('template', time.perf_counter() - start))
+        return response
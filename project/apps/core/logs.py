@@ -0,0 +1,183 @@
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+
+
+# Attributes of every log record, anything else was passed as extra
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def parse_levels(value):
+    """
+    Parse 'books=DEBUG,django.db.backends=WARNING' into {logger name: level}.
+    """
+    levels = {}
+    for item in (value or '').split(','):
+        name, separator, level = item.partition('=')
+        if separator and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def parse_rates(value):
+    """
+    Parse 'django.request=0.1,books=0.5' into {logger name: kept fraction}.
+    """
+    return {name: float(rate) for name, rate in parse_levels(value).items()}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format a record as one line of JSON, with the values passed as extra.
+    """
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                data[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records below WARNING of the given loggers and
+    their children, e.g. {'django.db.backends': 0.01}. Warnings and errors are always kept.
+    """
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def get_rate(self, name):
+        # The most specific configured logger name applies
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.get_rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class BackgroundHandler(logging.Handler):
+    """
+    Put records on a bounded in-memory queue, written by the target handlers from
+    a listener thread so that logging never waits on a file or a stream. The
+    listener starts with the first record, and again in a forked child, e.g. a
+    gunicorn worker of a preloaded application. Records arriving while the queue
+    is full are dropped, their number is logged once the queue has room again.
+
+    The targets are handler objects, in dictConfig 'cfg://handlers.<name>' references
+    to handlers whose names sort before the name of this one.
+    Not a logging.handlers.QueueHandler, which dictConfig configures on its own
+    terms since Python 3.12.
+    """
+    def __init__(self, handlers, queue_size=10000):
+        # dictConfig converts the references of a list when its items are read
+        targets = [handlers[i] for i in range(len(handlers))]
+        if not all(isinstance(target, logging.Handler) for target in targets):
+            # dictConfig configures handlers in the order of their names
+            raise ValueError('The target handlers must be configured first, name them before this one.')
+
+        super().__init__()
+        self.targets = targets
+        self.queue_size = queue_size
+        self.queue = queue.Queue(queue_size)
+        self.listener = None
+        self.dropped = 0
+        self.dropped_total = 0
+        self.start_lock = threading.Lock()
+        atexit.register(self.stop)
+        os.register_at_fork(after_in_child=self.reset)
+
+    def start(self):
+        with self.start_lock:
+            if self.listener is not None:
+                return
+            self.listener = logging.handlers.QueueListener(self.queue, *self.targets, respect_handler_level=True)
+            self.listener.start()
+
+    def stop(self):
+        # Write the queued records before the process exits
+        with self.start_lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+
+    def reset(self):
+        # The listener thread does not survive a fork, the child starts its own.
+        # Records queued by the parent are written by the parent.
+        self.queue = queue.Queue(self.queue_size)
+        self.listener = None
+        self.dropped = 0
+        self.start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Resolve the message and exception now, the arguments may change once queued.
+        # The message is not formatted, the target handlers do that.
+        prepared = logging.makeLogRecord(vars(record))
+        prepared.msg = record.getMessage()
+        prepared.args = None
+        if record.exc_info:
+            prepared.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+        prepared.exc_info = None
+        return prepared
+
+    def emit(self, record):
+        if self.listener is None:
+            self.start()
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+            self.dropped_total += 1
+            return
+        except Exception:
+            self.handleError(record)
+            return
+
+        if self.dropped:
+            self.report_dropped()
+
+    def report_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        record = logging.makeLogRecord({
+            'name': __name__,
+            'levelno': logging.WARNING,
+            'levelname': logging.getLevelName(logging.WARNING),
+            'msg': f'{dropped} log records dropped, the logging queue was full',
+            'dropped': dropped,
+        })
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += dropped
+
+    def close(self):
+        self.stop()
+        super().close()
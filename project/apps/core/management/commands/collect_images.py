@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+# Application modules
+from apps.core.images import collect_blobs
+
+
+class Command(BaseCommand):
+    help = 'Delete the image blobs no longer referenced by any book, author or profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=3600, help='Keep blobs used less than this many seconds ago.')
+        parser.add_argument('--dry-run', action='store_true', help='Count the unreferenced blobs without deleting them.')
+
+    def handle(self, *args, **options):
+        deleted = collect_blobs(grace=options['grace'], dry_run=options['dry_run'])
+
+        if options['dry_run']:
+            self.stdout.write(f'{deleted} unreferenced image blob(s).')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{deleted} image blob(s) deleted.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+import time
+
+# Application modules
+from apps.core.images import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Process pending image jobs (thumbnails of covers, headshots and avatars).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the pending jobs and exit.')
+        parser.add_argument('--batch', type=int, default=10, help='Number of jobs claimed at a time.')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+
+    def handle(self, *args, **options):
+        total = 0
+
+        while True:
+            processed = process_pending(limit=options['batch'])
+            total += processed
+
+            if not processed:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} image job(s) processed.'))
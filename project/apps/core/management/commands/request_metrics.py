@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+import json
+
+# Application modules
+from apps.core.instrumentation import collect, summarize, TIMINGS, PERCENTILES
+
+
+class Command(BaseCommand):
+    help = 'Print the request timing percentiles per URL name, as published by the running server processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Only print this URL name.')
+        parser.add_argument('--json', action='store_true', help='Print the summary as JSON.')
+
+    def handle(self, *args, **options):
+        summary = summarize(collect())
+        if options['view']:
+            summary = {view: metrics for view, metrics in summary.items() if view == options['view']}
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        if not summary:
+            self.stdout.write('No requests recorded yet.')
+            return
+
+        columns = ['count', 'mean'] + [f'p{percent}' for percent in PERCENTILES]
+        self.stdout.write(f"{'URL name':<32}{'metric':<14}" + ''.join(f'{column:>10}' for column in columns))
+        for view, metrics in summary.items():
+            for name in TIMINGS + ['queries', 'cache_misses']:
+                if name in metrics:
+                    row = metrics[name]
+                    values = [f"{row['count']:>10}"] + [f'{row[column]:>10.1f}' for column in columns[1:]]
+                    self.stdout.write(f'{view:<32}{name:<14}' + ''.join(values))
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='kind',
+            field=models.CharField(choices=[('t', 'Thumbnail'), ('r', 'Renditions')], default='t', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='imagejob',
+            name='rendition',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='imagejob',
+            name='default',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='imagejob',
+            name='target',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_imagejob_kind_imagejob_rendition_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='previous',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('source_digest', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('refcount', models.IntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refcount'], name='core_imageb_refcoun_261ff6_idx')],
+            },
+        ),
+    ]
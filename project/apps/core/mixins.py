@@ -0,0 +1,14 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """
+    LoginRequiredMixin for views with async handlers. The user is loaded with
+    the async API and set on the request, request.user would query the
+    database from the event loop otherwise.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
@@ -1,3 +1,74 @@
 from django.db import models
+from django.contrib.contenttypes.models import ContentType
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+# Application models
+class ImageJob(models.Model):
+    # Define choices as class constants
+    PENDING = 'p'
+    RUNNING = 'r'
+    DONE = 'd'
+    FAILED = 'f'
+
+    THUMBNAIL = 't'
+    RENDITIONS = 'r'
+
+    KIND_CHOICES = [
+        (THUMBNAIL, _('Thumbnail')),
+        (RENDITIONS, _('Renditions')),
+    ]
+
+    STATUS_CHOICES = [
+        (PENDING, _('Pending')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (FAILED, _('Failed')),
+    ]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    field_name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES, default=THUMBNAIL)
+    # Name of the registered renditions generated from the thumbnail
+    rendition = models.CharField(max_length=50, blank=True)
+    # Storage names of the raw upload, the rendition and the fallback image
+    source = models.CharField(max_length=255)
+    target = models.CharField(max_length=255, blank=True)
+    default = models.CharField(max_length=255, blank=True)
+    # Image the field pointed at before the upload, released once the job is done
+    previous = models.CharField(max_length=255, blank=True)
+    status = models.CharField(_('Status'), max_length=1, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["created"]
+        indexes = [
+            models.Index(fields=['status', 'created']),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type.model}:{self.object_id} {self.field_name} ({self.get_status_display()})"
+
+class ImageBlob(models.Model):
+    # SHA-256 of the thumbnail bytes, the blob is stored under a name derived from it
+    digest = models.CharField(max_length=64, unique=True)
+    # SHA-256 of the first upload that produced the thumbnail, to skip decoding identical uploads
+    source_digest = models.CharField(max_length=64, db_index=True, blank=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveIntegerField(default=0)
+    # Number of model rows pointing at the blob
+    refcount = models.IntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['refcount']),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,27 @@
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext
+from contextlib import contextmanager
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin failing a test when a block runs more queries than its budget,
+    so that pages keep a fixed number of queries however many books they show.
+    """
+    @contextmanager
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, start=1))
+            self.fail(f'{executed} queries executed, {budget} expected at most\nCaptured queries were:\n{queries}')
+
+    def assertViewQueries(self, budget, url, client=None, status_code=200):
+        # Request a page within a query budget and return the response
+        client = client or self.client
+        with self.assertMaxQueries(budget):
+            response = client.get(url)
+        self.assertEqual(response.status_code, status_code)
+        return response
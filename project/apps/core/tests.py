@@ -1,3 +1,103 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from io import BytesIO
+import tempfile
 
-# Create your tests here.
+# Application modules
+from apps.books.models import Book
+from apps.core.cache import bump_namespace, get_namespace
+from apps.core.images import JOB_MAX_ATTEMPTS, JOB_TIMEOUT, claim_jobs, collect_blobs, process_pending
+from apps.core.models import ImageBlob, ImageJob
+
+
+def png_upload(name, color='red'):
+    img_io = BytesIO()
+    Image.new('RGB', (400, 600), color).save(img_io, format='PNG')
+    return SimpleUploadedFile(name, img_io.getvalue(), content_type='image/png')
+
+
+class NamespaceTests(TestCase):
+    def test_bump_waits_for_the_commit(self):
+        version = get_namespace(1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            bump_namespace(1)
+        self.assertEqual(get_namespace(1), version)
+
+        callbacks[0]()
+        self.assertNotEqual(get_namespace(1), version)
+
+
+class ImageBlobTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, IMAGE_JOBS_MODE='queue')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user('reader')
+
+    def add_book(self, isbn, title, upload):
+        book = Book.objects.create(isbn=isbn, title=title, user=self.user, cover_image=upload)
+        process_pending()
+        book.refresh_from_db()
+        return book
+
+    def test_identical_covers_share_a_counted_blob(self):
+        first = self.add_book('9780306406157', 'FIRST', png_upload('first.png'))
+        second = self.add_book('9781861972712', 'SECOND', png_upload('second.png'))
+
+        self.assertEqual(first.cover_image.name, second.cover_image.name)
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+        self.assertTrue(default_storage.exists(blob.name))
+
+        first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+        self.assertEqual(collect_blobs(grace=0), 0)
+
+        second.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 0)
+        self.assertEqual(collect_blobs(grace=0), 1)
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.name))
+
+    def test_replaced_cover_is_released(self):
+        book = self.add_book('9780306406157', 'FIRST', png_upload('first.png'))
+        old = ImageBlob.objects.get(name=book.cover_image.name)
+
+        book.cover_image = png_upload('blue.png', color='blue')
+        book.save()
+        process_pending()
+        book.refresh_from_db()
+
+        old.refresh_from_db()
+        self.assertEqual(old.refcount, 0)
+        self.assertEqual(ImageBlob.objects.get(name=book.cover_image.name).refcount, 1)
+
+    def test_collect_counts_references_again(self):
+        book = self.add_book('9780306406157', 'FIRST', png_upload('first.png'))
+        # A counter gone wrong is corrected instead of deleting a used blob
+        ImageBlob.objects.update(refcount=0)
+        self.assertEqual(collect_blobs(grace=0), 0)
+        self.assertEqual(ImageBlob.objects.get(name=book.cover_image.name).refcount, 1)
+
+    def test_jobs_of_a_lost_worker_are_claimed_again(self):
+        Book.objects.create(isbn='9780306406157', title='FIRST', user=self.user, cover_image=png_upload('first.png'))
+        job = claim_jobs()[0]
+        self.assertEqual(claim_jobs(), [])
+
+        stale = timezone.now() - timezone.timedelta(seconds=JOB_TIMEOUT + 1)
+        ImageJob.objects.filter(pk=job.pk).update(modified=stale)
+        self.assertEqual([reclaimed.pk for reclaimed in claim_jobs()], [job.pk])
+
+        # A job that keeps losing its worker is given up
+        ImageJob.objects.filter(pk=job.pk).update(modified=stale, attempts=JOB_MAX_ATTEMPTS)
+        self.assertEqual(claim_jobs(), [])
+        self.assertEqual(ImageJob.objects.get(pk=job.pk).status, ImageJob.FAILED)
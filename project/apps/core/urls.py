@@ -6,4 +6,6 @@ urlpatterns = [
     path('home/', views.HomeView.as_view(), name='home'),
     path('about/', views.AboutView.as_view(), name='about'),
     path("mine/", views.MyView.as_view(), name="my-view"),
+    path('metrics/', views.RequestMetricsView.as_view(), name='request_metrics'),
+    path('database/', views.DatabaseStatusView.as_view(), name='database_status'),
 ]
\ No newline at end of file
@@ -3,7 +3,10 @@ from django.views import View
 from django.views.generic.base import TemplateView
 from django.shortcuts import render
 from django.utils.translation import gettext
-from apps.books.models import Book, Author, Publisher
+from django.contrib.auth.mixins import UserPassesTestMixin
+from apps.books.statistics import get_statistics
+from apps.core.database import database_status
+from apps.core.instrumentation import collect, summarize, TIMINGS
 
 
 ABOUT_TEXT = '''
@@ -38,8 +41,11 @@ class HomeView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['message'] = gettext("Welcome to our site!")
-        context['num_books'] = Book.objects.all().count()
-        context['num_authors'] = Author.objects.count()
+        # Library counters of the signed in user, served from the statistics cache
+        if self.request.user.is_authenticated:
+            statistics = get_statistics(self.request.user)
+            context['num_books'] = statistics['books']
+            context['num_authors'] = statistics['authors']
         return context
     
     
@@ -56,3 +62,39 @@ class MyView(View):
     def get(self, request, *args, **kwargs):
         return HttpResponse("Hello, World!")
 
+
+class RequestMetricsView(UserPassesTestMixin, TemplateView):
+    """
+    Shows the request timing percentiles per URL name, for staff users.
+    """
+    template_name = "core/request_metrics.html"
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # One row per URL name and metric, timings first
+        names = TIMINGS + ['queries', 'cache_misses']
+        context['rows'] = [
+            dict(stats, view=view, metric=name)
+            for view, metrics in summarize(collect()).items()
+            for name in names if name in metrics
+            for stats in [metrics[name]]
+        ]
+        return context
+
+
+class DatabaseStatusView(UserPassesTestMixin, TemplateView):
+    """
+    Shows the database connection settings and pool usage, for staff users.
+    """
+    template_name = "core/database_status.html"
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['status'] = database_status()
+        return context
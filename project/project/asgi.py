@@ -3,6 +3,11 @@ ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The library tabs, search, book detail and rating views are async and keep a
+worker free while a slow client reads the page. Serve it with uvicorn workers:
+
+    gunicorn project.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -13,4 +18,7 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
+# Persistent connections would pile up, one per request thread, use DB_POOL=1 to reuse connections
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
 application = get_asgi_application()
@@ -10,7 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
+import os
+import sys
+
+from apps.core.logs import parse_levels, parse_rates
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,12 +46,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'apps.accounts',
     'apps.core',
     'apps.books',
 ]
 
 MIDDLEWARE = [
+    'apps.core.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,20 +97,77 @@ DATABASES = {
 }
 """
 
+# Connection from the environment: DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT.
+# Under WSGI connections are kept for DB_CONN_MAX_AGE seconds and checked before being reused.
+# Under ASGI they default to closing after each request, see project/asgi.py: every request
+# runs in a new thread, and each thread would hold its own connection until it expires.
+# DB_POOL=1 gives each process a psycopg 3 connection pool instead (needs psycopg[pool]),
+# the way to reuse connections under ASGI. Django requires persistent connections off then.
+DB_POOL = os.environ.get('DB_POOL', '').lower() in ('1', 'true', 'yes')
+
+# The password has no default outside development and tests, where the local 'admin' one is used
+DB_PASSWORD = os.environ.get('DB_PASSWORD')
+if DB_PASSWORD is None:
+    if not (DEBUG or 'test' in sys.argv):
+        raise ImproperlyConfigured('Set the DB_PASSWORD environment variable.')
+    DB_PASSWORD = 'admin'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'mylibrary',
-        'USER': 'admin',
-        'PASSWORD': 'admin',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'mylibrary'),
+        'USER': os.environ.get('DB_USER', 'admin'),
+        'PASSWORD': DB_PASSWORD,
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() in ('1', 'true', 'yes'),
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
         'TEST': {
             'NAME': 'test_mylibrary',  # test database name
         },
     }
 }
 
+if DB_POOL:
+    # Per process, size the pool so that workers x max_size stays below max_connections
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
+# Cache shared by the gunicorn workers
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Redis when REDIS_URL is set (needs the redis package), else files in CACHE_DIR, local memory for tests
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'KEY_PREFIX': 'mylibrary',
+        }
+    }
+elif 'test' in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR / 'cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -178,6 +242,18 @@ else:
 DATA_UPLOAD_MAX_MEMORY_SIZE = 2097152  # 2MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 2097152  # 2MB
 
+# Image thumbnails are produced by background jobs
+# 'queue' leaves them to the process_images worker, 'thread' runs them in a thread pool of the web process
+IMAGE_JOBS_MODE = 'queue'
+IMAGE_JOBS_THREADS = 2
+
+# Library search backend, full-text search needs PostgreSQL, other databases use in-memory inverted indexes
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    BOOKS_SEARCH_BACKEND = 'apps.books.search.postgres.PostgresSearchBackend'
+else:
+    BOOKS_SEARCH_BACKEND = 'apps.books.search.memory.InvertedIndexBackend'
+BOOKS_SEARCH_INDEX_DIR = BASE_DIR / 'search_index'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -186,6 +262,13 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Send mail to console in debug mode
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Levels and sampling come from the environment, e.g.
+#   LOG_LEVEL=INFO LOG_LEVELS="books=DEBUG,django.db.backends=DEBUG" LOG_SAMPLING="django.db.backends=0.01"
+# Loggers log to a queue, the file and console handlers write from a listener thread
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_FILE = os.environ.get('LOG_FILE', str(BASE_DIR / 'logs' / 'debug.log'))
+
 LOGGING = {
     'version': 1,
     # Keep existing loggers
@@ -200,41 +283,61 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'apps.core.logs.JsonFormatter',
+        },
+    },
+    'filters': {
+        # Keep a fraction of the debug and info records of hot loggers
+        'sampling': {
+            '()': 'apps.core.logs.SamplingFilter',
+            'rates': parse_rates(os.environ.get('LOG_SAMPLING')),
+        },
     },
     # Define what happens to log messages
     'handlers': { 
         'console': {
             # Minimum level of messages handled
-            'level': 'DEBUG',
+            'level': os.environ.get('LOG_CONSOLE_LEVEL', 'DEBUG' if DEBUG else 'WARNING').upper(),
             # Send logs to console
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
         'file': {
             'level': 'DEBUG',
-            # Send logs to django.log file
+            # Send logs to the log file (located at project level by default)
             'class': 'logging.FileHandler',
-            # File path for logs (located at project level)
-            'filename': 'logs/debug.log',
-            'formatter': 'verbose',
+            'filename': LOG_FILE,
+            'formatter': LOG_FORMAT,
+            'delay': True,
         },
+        'queue': {
+            'level': 'DEBUG',
+            # Hand records over to the console and file handlers without blocking
+            'class': 'apps.core.logs.BackgroundHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'filters': ['sampling'],
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
     },
-    # Define the loggers for different parts of the app
-    'loggers': { 
+    # Define the loggers for different parts of the app, all propagate to the queue
+    'loggers': {
         'django': {
-            'handlers': ['file'],
-            'level': 'DEBUG',
-            'propagate': True,
+            'level': LOG_LEVEL,
+        },
+        # SQL of every query only when asked for, e.g. LOG_LEVELS="django.db.backends=DEBUG"
+        'django.db.backends': {
+            'level': 'INFO',
         },
         'accounts': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': False,
+            'level': LOG_LEVEL,
         },
         'books': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': True,
+            'level': LOG_LEVEL,
         },
+        **{name: {'level': level} for name, level in parse_levels(os.environ.get('LOG_LEVELS')).items()},
     },
 }
@@ -25,6 +25,7 @@ urlpatterns = [
     path('',include('apps.accounts.urls')),
     path('',include('apps.core.urls')),
     path('',include('apps.books.urls')),
+    path('api/v1/',include('apps.books.api.urls')),
 ]
 
 if settings.DEBUG: